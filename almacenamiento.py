@@ -0,0 +1,323 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from gspread.utils import numericise_all
+import cola
+import hojas
+from entidades import normalizar
+
+# --- ALMACENAMIENTO ---
+# La app solo habla con un `Almacen`. Hay tres modos:
+#   - "gsheets": Google Sheets directamente (el de siempre).
+#   - "sqlite":  una base de datos local, sin red (para desarrollo, pruebas y benchmarks).
+#   - "espejo":  SQLite como fuente de verdad y copia a Google Sheets en segundo plano.
+
+class ErrorAlmacen(Exception):
+    pass
+
+class ConflictoEdicion(ErrorAlmacen):
+    """La fila a eliminar ya no contiene lo esperado (otra sesión ha modificado el historial)."""
+    def __init__(self):
+        super().__init__("El registro ha cambiado desde que se cargó la página. Recarga e inténtalo de nuevo.")
+
+def coincide(valores, registro, encabezados):
+    # Compara como texto normalizado: Sheets devuelve números donde el registro local puede tener
+    # cadenas, y en memoria los nombres llevan su grafía canónica ("arsenal " -> "Arsenal")
+    valores = list(valores) + [""] * (len(encabezados) - len(valores))
+    return all(normalizar(v) == normalizar(registro.get(c, "")) for c, v in zip(encabezados, valores))
+
+class Almacen:
+    """Interfaz común. Los historiales se leen como registros (dicts) en el orden de la hoja."""
+
+    # True si la marca de modificación sigue valiendo en otro proceso (la copia local se fía de ella al arrancar)
+    marca_duradera = False
+
+    def añadir_evento(self, nombre_hoja, fila):
+        raise NotImplementedError
+
+    def añadir_eventos(self, nombre_hoja, filas):
+        """Varios eventos seguidos de la misma pestaña (importaciones)."""
+        for fila in filas: self.añadir_evento(nombre_hoja, fila)
+
+    def eliminar_evento(self, nombre_hoja, indice, registro):
+        """Elimina el evento número `indice` del historial; `registro` es el que se espera encontrar ahí."""
+        raise NotImplementedError
+
+    def leer_historiales(self, nombres_hojas):
+        raise NotImplementedError
+
+    def escribir_tablas(self, tablas):
+        """Guarda las tablas derivadas (clasificaciones): {nombre_hoja: [encabezados, fila, ...]}."""
+        raise NotImplementedError
+
+    def reiniciar(self, encabezados_por_hoja):
+        """Deja cada pestaña solo con sus encabezados."""
+        raise NotImplementedError
+
+    def pendientes(self):
+        # Eventos aceptados que aún no están en el destino final
+        return []
+
+    def errores(self):
+        """Escrituras que no han llegado al destino final y ya no se van a reintentar solas."""
+        return []
+
+    def marca_modificacion(self):
+        """Valor barato de obtener que cambia cuando los datos se modifican por otra vía. None si no se sabe."""
+        return None
+
+    def cambio_propio(self, desde, hasta):
+        """True si la marca ha pasado de `desde` a `hasta` solo por escrituras de este proceso
+        (que ya están en memoria). Si no se puede saber, False."""
+        return False
+
+# --- GOOGLE SHEETS ---
+class AlmacenGSheets(Almacen):
+    marca_duradera = True  # la hora de modificación de Drive
+
+    def __init__(self, encabezados_historial, ruta_diario):
+        self.encabezados_historial = encabezados_historial
+        self.cola = cola.obtener_cola(ruta_diario, self._subir_filas)
+
+    @staticmethod
+    def _subir_filas(nombre_hoja, filas):
+        # RAW, como escribir_tablas: con USER_ENTERED Sheets reinterpreta lo escrito (un
+        # ResultadoManual "2-1" acaba siendo una fecha) y la hoja ya no coincide con lo que hay
+        # en memoria, ni para el borrado optimista ni para las huellas de comprobar/arrancar
+        hojas.escritura_propia(lambda: hojas.ejecutar(nombre_hoja, lambda sh: sh.append_rows(filas, value_input_option='RAW')))
+
+    def añadir_evento(self, nombre_hoja, fila):
+        # El evento queda guardado en el diario local al instante y se sube en segundo plano
+        self.cola.encolar(nombre_hoja, fila)
+
+    def añadir_eventos(self, nombre_hoja, filas):
+        # Un solo append_rows sin pasar por la cola, pero después de lo que hubiera en ella para conservar el orden
+        if not self.cola.vaciar(timeout=10):
+            raise ErrorAlmacen("Hay eventos pendientes de subir a Google Sheets. Inténtalo de nuevo en unos segundos.")
+        self._subir_filas(nombre_hoja, filas)
+
+    def eliminar_evento(self, nombre_hoja, indice, registro):
+        # Antes hay que subir lo pendiente para que los índices coincidan con las filas de la hoja
+        if not self.cola.vaciar(timeout=10):
+            raise ErrorAlmacen("Hay eventos pendientes de subir a Google Sheets. Inténtalo de nuevo en unos segundos.")
+        encabezados = self.encabezados_historial[nombre_hoja]
+        fila = indice + 2  # la fila 1 son los encabezados
+        def borrar_fila(sh):
+            # Comprobación optimista: solo se borra si la fila sigue siendo la que el usuario eligió
+            if not coincide(numericise_all(sh.row_values(fila)), registro, encabezados): raise ConflictoEdicion()
+            sh.delete_rows(fila)
+        hojas.escritura_propia(lambda: hojas.ejecutar(nombre_hoja, borrar_fila))
+
+    def leer_historiales(self, nombres_hojas):
+        # Se intenta subir lo pendiente antes de leer, pero si no se puede se lee igual
+        self.cola.vaciar(timeout=5)
+        # La hoja y los pendientes se leen sin subidas en medio: si no, un lote podría faltar
+        # o salir dos veces y los índices ya no coincidirían con las filas de la hoja
+        with self.cola.en_pausa(timeout=30):
+            historiales = hojas.leer_historiales(nombres_hojas)
+            # Lo que aún no se ha podido subir se muestra igualmente
+            for nombre_hoja in nombres_hojas:
+                encabezados = self.encabezados_historial[nombre_hoja]
+                historiales[nombre_hoja] = historiales.get(nombre_hoja, []) + [dict(zip(encabezados, fila)) for fila in self.cola.pendientes(nombre_hoja)]
+        return historiales
+
+    def escribir_tablas(self, tablas):
+        hojas.escribir_tablas(tablas)
+
+    def reiniciar(self, encabezados_por_hoja):
+        self.cola.vaciar(timeout=10)
+        for nombre_hoja, encabezados in encabezados_por_hoja.items():
+            def limpiar(sh):
+                sh.clear(); sh.update([encabezados], 'A1')
+            hojas.escritura_propia(lambda: hojas.ejecutar(nombre_hoja, limpiar))
+        hojas.olvidar_tablas()
+
+    def pendientes(self):
+        return self.cola.pendientes()
+
+    def marca_modificacion(self):
+        # Una sola llamada a la API de Drive; cambia con cualquier edición, también con las propias
+        return hojas.marca_modificacion()
+
+    def cambio_propio(self, desde, hasta):
+        return hojas.cambio_propio(desde, hasta)
+
+# --- SQLITE ---
+def _tabla(nombre_hoja):
+    return '"' + nombre_hoja.replace('"', '""') + '"'
+
+# Columnas por las que se filtra o busca a menudo
+COLUMNAS_INDEXADAS = ("Fecha", "Equipo Ganador", "Equipo Perdedor", "Goleador", "Asistente", "Portero")
+
+class AlmacenSQLite(Almacen):
+    """Una tabla por historial (con `id` autoincremental que fija el orden) y una tabla
+    `tablas_derivadas` con cada clasificación guardada como JSON."""
+
+    def __init__(self, ruta, encabezados_historial):
+        self.ruta = ruta
+        self.encabezados_historial = encabezados_historial
+        self._lock = threading.RLock()
+        self.conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self.conexion:
+            for nombre_hoja, encabezados in encabezados_historial.items():
+                columnas = ", ".join(f"{_tabla(c)}" for c in encabezados)
+                self.conexion.execute(f"CREATE TABLE IF NOT EXISTS {_tabla(nombre_hoja)} (id INTEGER PRIMARY KEY AUTOINCREMENT, {columnas})")
+                for c in encabezados:
+                    if c in COLUMNAS_INDEXADAS:
+                        self.conexion.execute(f"CREATE INDEX IF NOT EXISTS {_tabla(f'idx_{nombre_hoja}_{c}')} ON {_tabla(nombre_hoja)} ({_tabla(c)})")
+            self.conexion.execute("CREATE TABLE IF NOT EXISTS tablas_derivadas (nombre TEXT PRIMARY KEY, datos TEXT NOT NULL)")
+
+    def _insertar(self, nombre_hoja, filas):
+        encabezados = self.encabezados_historial[nombre_hoja]
+        columnas = ", ".join(_tabla(c) for c in encabezados)
+        huecos = ", ".join("?" for _ in encabezados)
+        filas = [list(f) + [""] * (len(encabezados) - len(f)) for f in filas]
+        self.conexion.executemany(f"INSERT INTO {_tabla(nombre_hoja)} ({columnas}) VALUES ({huecos})", filas)
+
+    def añadir_evento(self, nombre_hoja, fila):
+        with self._lock, self.conexion:
+            self._insertar(nombre_hoja, [fila])
+
+    def añadir_eventos(self, nombre_hoja, filas):
+        with self._lock, self.conexion:
+            self._insertar(nombre_hoja, filas)
+
+    def eliminar_evento(self, nombre_hoja, indice, registro):
+        encabezados = self.encabezados_historial[nombre_hoja]
+        columnas = ", ".join(_tabla(c) for c in encabezados)
+        with self._lock, self.conexion:
+            fila = self.conexion.execute(f"SELECT id, {columnas} FROM {_tabla(nombre_hoja)} ORDER BY id LIMIT 1 OFFSET ?", (indice,)).fetchone()
+            if fila is None or not coincide(fila[1:], registro, encabezados): raise ConflictoEdicion()
+            self.conexion.execute(f"DELETE FROM {_tabla(nombre_hoja)} WHERE id = ?", (fila[0],))
+
+    def leer_historiales(self, nombres_hojas):
+        historiales = {}
+        with self._lock:
+            for nombre_hoja in nombres_hojas:
+                encabezados = self.encabezados_historial[nombre_hoja]
+                columnas = ", ".join(_tabla(c) for c in encabezados)
+                cursor = self.conexion.execute(f"SELECT {columnas} FROM {_tabla(nombre_hoja)} ORDER BY id")
+                historiales[nombre_hoja] = [dict(zip(encabezados, fila)) for fila in cursor]
+        return historiales
+
+    def escribir_tablas(self, tablas):
+        with self._lock, self.conexion:
+            self.conexion.executemany("INSERT OR REPLACE INTO tablas_derivadas (nombre, datos) VALUES (?, ?)",
+                                      [(nombre, json.dumps(datos, ensure_ascii=False)) for nombre, datos in tablas.items()])
+
+    def reiniciar(self, encabezados_por_hoja):
+        with self._lock, self.conexion:
+            for nombre_hoja, encabezados in encabezados_por_hoja.items():
+                if nombre_hoja in self.encabezados_historial: self.conexion.execute(f"DELETE FROM {_tabla(nombre_hoja)}")
+                else: self.conexion.execute("INSERT OR REPLACE INTO tablas_derivadas (nombre, datos) VALUES (?, ?)", (nombre_hoja, json.dumps([encabezados], ensure_ascii=False)))
+
+    def marca_modificacion(self):
+        # data_version solo cambia cuando otra conexión (otro proceso) modifica la base de datos
+        with self._lock:
+            return self.conexion.execute("PRAGMA data_version").fetchone()[0]
+
+    def esta_vacio(self):
+        with self._lock:
+            return all(self.conexion.execute(f"SELECT 1 FROM {_tabla(n)} LIMIT 1").fetchone() is None for n in self.encabezados_historial)
+
+# --- ESPEJO: SQLITE + GOOGLE SHEETS EN SEGUNDO PLANO ---
+class AlmacenEspejo(Almacen):
+    """Lee y escribe en SQLite (a velocidad de disco local) y repite cada escritura en
+    Google Sheets desde un único hilo, para que se apliquen en el mismo orden. Los eventos
+    sueltos también pasan por ese hilo (que los deja en la cola de escritura): si fueran
+    directos a la cola podrían subirse antes que una importación o un borrado anteriores."""
+
+    REINTENTOS = 5
+    ESPERA = 2.0  # segundos antes del primer reintento; se dobla en cada uno
+    ESPERA_MAXIMA = 60.0
+
+    def __init__(self, local, remoto):
+        self.local, self.remoto = local, remoto
+        self._hilo = ThreadPoolExecutor(max_workers=1, thread_name_prefix="espejo-gsheets")
+        self._lock_fallidas = threading.Lock()
+        self.fallidas = []  # [(operación, error)] que no se pudieron repetir en Google Sheets
+        if local.esta_vacio():
+            # Primer arranque: se parte de lo que ya hay en Google Sheets
+            historiales = remoto.leer_historiales(list(local.encabezados_historial))
+            for nombre_hoja, registros in historiales.items():
+                encabezados = local.encabezados_historial[nombre_hoja]
+                local.añadir_eventos(nombre_hoja, [[r.get(c, "") for c in encabezados] for r in registros])
+
+    def _en_segundo_plano(self, operacion, *args):
+        # Cada operación se reintenta con espera exponencial (el hilo no sigue con las
+        # siguientes mientras tanto, así se conserva el orden). Si se agotan los reintentos, o
+        # la hoja ya no tiene lo esperado, Google Sheets ha dejado de ser una copia de SQLite:
+        # se anota para mostrarlo y poder volver a copiarlo todo con `resincronizar`
+        def tarea():
+            for intento in range(self.REINTENTOS + 1):
+                try:
+                    return operacion(*args)
+                except ConflictoEdicion as e:
+                    error = e
+                    break
+                except Exception as e:
+                    error = e
+                    if intento < self.REINTENTOS: time.sleep(min(self.ESPERA_MAXIMA, self.ESPERA * 2 ** intento) * random.uniform(0.5, 1.0))
+            with self._lock_fallidas: self.fallidas.append((operacion.__name__, error))
+        self._hilo.submit(tarea)
+
+    def añadir_evento(self, nombre_hoja, fila):
+        self.local.añadir_evento(nombre_hoja, fila)
+        self._en_segundo_plano(self.remoto.añadir_evento, nombre_hoja, fila)
+
+    def añadir_eventos(self, nombre_hoja, filas):
+        self.local.añadir_eventos(nombre_hoja, filas)
+        self._en_segundo_plano(self.remoto.añadir_eventos, nombre_hoja, filas)
+
+    def eliminar_evento(self, nombre_hoja, indice, registro):
+        self.local.eliminar_evento(nombre_hoja, indice, registro)
+        self._en_segundo_plano(self.remoto.eliminar_evento, nombre_hoja, indice, registro)
+
+    def leer_historiales(self, nombres_hojas):
+        return self.local.leer_historiales(nombres_hojas)
+
+    def escribir_tablas(self, tablas):
+        self.local.escribir_tablas(tablas)
+        self._en_segundo_plano(self.remoto.escribir_tablas, tablas)
+
+    def reiniciar(self, encabezados_por_hoja):
+        self.local.reiniciar(encabezados_por_hoja)
+        self._en_segundo_plano(self.remoto.reiniciar, encabezados_por_hoja)
+
+    def pendientes(self):
+        return self.remoto.pendientes()
+
+    def errores(self):
+        with self._lock_fallidas:
+            return [f"{operacion}: {error}" for operacion, error in self.fallidas]
+
+    def resincronizar(self):
+        """Vuelve a copiar los historiales de SQLite a Google Sheets (después de las operaciones
+        que ya están en marcha) y olvida los errores anteriores."""
+        encabezados_historial = self.local.encabezados_historial
+        historiales = self.local.leer_historiales(list(encabezados_historial))
+        def copiar():
+            self.remoto.reiniciar(encabezados_historial)
+            for nombre_hoja, registros in historiales.items():
+                if registros: self.remoto.añadir_eventos(nombre_hoja, [[r.get(c, "") for c in encabezados_historial[nombre_hoja]] for r in registros])
+            with self._lock_fallidas: self.fallidas.clear()
+        self._en_segundo_plano(copiar)
+
+    def marca_modificacion(self):
+        # SQLite es la fuente de verdad: las ediciones directas en la hoja no se traen de vuelta
+        return self.local.marca_modificacion()
+
+_almacen = None
+_lock_almacen = threading.Lock()
+
+def obtener_almacen(crear):
+    """Devuelve el almacén único del proceso; `crear()` solo se llama la primera vez."""
+    global _almacen
+    with _lock_almacen:
+        if _almacen is None: _almacen = crear()
+        return _almacen
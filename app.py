@@ -1,144 +1,129 @@
 import streamlit as st
 import pandas as pd
+import altair as alt
 import gspread
+import os
+import time
+import hojas
+import metricas
+import importacion
+import almacenamiento
+import estado
+import entidades
 from datetime import datetime
-from collections import Counter
+
+# Todo el rerun se cronometra (ver el final del script y la página "Rendimiento")
+inicio_rerun = time.perf_counter()
 
 # --- CONFIGURACIÓN Y CONEXIÓN ---
-CREDS = st.secrets["gcp_creds"]
 ID_HOJA_CALCULO = "18x6wCv0E7FOpuvwZpWYRSFi56E-_RR2Gm1deHyCLo2Y" # ID que proporcionaste
+# Los encabezados de cada historial están en estado.py (también los usan los benchmarks)
+ENCABEZADOS_PARTIDOS = estado.ENCABEZADOS_PARTIDOS
+ENCABEZADOS_HISTORIAL = estado.ENCABEZADOS_HISTORIAL
+HOJAS_HISTORIAL = list(ENCABEZADOS_HISTORIAL)
+RUTA_DIARIO_EVENTOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cola_eventos.jsonl")
+RUTA_SQLITE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tonoi.sqlite3")
+RUTA_ESTADO_IMPORTACION = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".importaciones.json")
+# Copia de la instantánea para arrancar sin descargar los historiales enteros (ver copia_local.py)
+RUTA_COPIA_LOCAL = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".copia_local.bin")
+# "gsheets" (por defecto), "sqlite" (sin conexión) o "espejo" (SQLite + copia a Google Sheets en segundo plano)
+MODO_ALMACEN = os.environ.get("TONOI_ALMACEN", "gsheets")
+# Si se define, al final de cada rerun se escriben ahí las métricas en formato Prometheus
+RUTA_METRICAS = os.environ.get("TONOI_METRICAS_PROMETHEUS")
+
+def crear_almacen():
+    if MODO_ALMACEN == "sqlite": return almacenamiento.AlmacenSQLite(RUTA_SQLITE, ENCABEZADOS_HISTORIAL)
+    hojas.configurar(st.secrets["gcp_creds"], ID_HOJA_CALCULO)
+    remoto = almacenamiento.AlmacenGSheets(ENCABEZADOS_HISTORIAL, RUTA_DIARIO_EVENTOS)
+    if MODO_ALMACEN == "espejo": return almacenamiento.AlmacenEspejo(almacenamiento.AlmacenSQLite(RUTA_SQLITE, ENCABEZADOS_HISTORIAL), remoto)
+    return remoto
+
+# Un solo almacén para todo el proceso (ver almacenamiento.py)
+almacen = almacenamiento.obtener_almacen(crear_almacen)
+
+def informar_error(contexto, e):
+    if isinstance(e, gspread.exceptions.WorksheetNotFound):
+        st.error(f"Error: No se encuentra la pestaña '{e}'. Por favor, créala con el nombre exacto.")
+    else:
+        st.error(f"{contexto}: {e}")
+
+# --- GESTIÓN DE DATOS ---
+# Historiales y clasificaciones compartidos por todas las sesiones (ver estado.py)
+instantanea = estado.obtener_instantanea()
+# Cada cuántos segundos se mira si alguien ha editado los datos por fuera de la app
+INTERVALO_COMPROBACION = 30
+# Como mucho una copia local cada tantos segundos (se guarda en otro hilo)
+INTERVALO_COPIA_LOCAL = 60
+
+def vincular_sesion():
+    # La sesión solo guarda referencias a la instantánea compartida, no copias
+    for clave in ('historial', 'historial_goles', 'historial_porterias', 'clasificacion', 'clasificacion_individual', 'clasificacion_porteros', 'portador_actual'):
+        st.session_state[clave] = getattr(instantanea, clave)
+    st.session_state.version = instantanea.version
 
-def conectar_a_gsheets(nombre_hoja):
+def recargar_y_recalcular_todo():
+    # En Google Sheets, las tres pestañas de historial se piden juntas en una sola petición
     try:
-        gc = gspread.service_account_from_dict(CREDS)
-        sh = gc.open_by_key(ID_HOJA_CALCULO).worksheet(nombre_hoja)
-        return sh
-    except gspread.exceptions.WorksheetNotFound:
-        st.error(f"Error: No se encuentra la pestaña '{nombre_hoja}'. Por favor, créala con el nombre exacto.")
-        return None
+        with metricas.etapa("recargar_y_recalcular_todo"):
+            instantanea.recargar(almacen, HOJAS_HISTORIAL)
     except Exception as e:
-        st.error(f"Error al conectar con Google Sheets: {e}")
-        return None
-
-# --- MOTORES DE CÁLCULO ---
-def calcular_todas_las_estadisticas(historial):
-    # (Esta función no necesita cambios, ya que lee 'Resultado' para la lógica del campeón)
-    if not historial: return {}
-    clasificacion = {}
-    rachas_actuales = {}
-    portador_trofeo = None
-    def asegurar_equipo(equipo):
-        if equipo and equipo not in clasificacion:
-            clasificacion[equipo] = {'V': 0, 'E': 0, 'D': 0, 'T': 0, 'P': 0, 'PPM': 0.0, 'Mejor Racha': 0, 'Destronamientos': 0, 'Intentos': 0, 'Indice Destronamiento': 0.0, 'Partidos con Trofeo': 0}
-            rachas_actuales[equipo] = 0
-    for i, partido in enumerate(historial):
-        ganador, perdedor, resultado = partido.get('Equipo Ganador'), partido.get('Equipo Perdedor'), partido.get('Resultado')
-        if not all([ganador, perdedor, resultado]): continue
-        asegurar_equipo(ganador); asegurar_equipo(perdedor)
-        if resultado == "Empate": clasificacion[ganador]['E'] += 1
-        else: clasificacion[ganador]['V'] += 1
-        clasificacion[perdedor]['D'] += 1
-        rachas_actuales[ganador] += 1
-        if rachas_actuales[ganador] > clasificacion[ganador]['Mejor Racha']: clasificacion[ganador]['Mejor Racha'] = rachas_actuales[ganador]
-        rachas_actuales[perdedor] = 0
-        if i == 0: portador_trofeo = ganador
-        else:
-            portador_en_partido = portador_trofeo
-            if ganador == portador_en_partido or perdedor == portador_en_partido:
-                aspirante = ganador if perdedor == portador_en_partido else perdedor
-                clasificacion[aspirante]['Intentos'] += 1
-                if resultado == "Victoria" and ganador == aspirante:
-                    clasificacion[aspirante]['Destronamientos'] += 1
-                    portador_trofeo = aspirante
-        if portador_trofeo: clasificacion[portador_trofeo]['Partidos con Trofeo'] += 1
-    for equipo, stats in clasificacion.items():
-        stats['T'] = stats['V'] + stats['E'] + stats['D']
-        stats['P'] = (stats['V'] * 2) + (stats['E'] * 1)
-        stats['PPM'] = (stats['P'] / stats['T']) if stats['T'] > 0 else 0.0
-        if stats['Intentos'] > 0: stats['Indice Destronamiento'] = (stats['Destronamientos'] / stats['Intentos']) * 100
-    if portador_trofeo and portador_trofeo in clasificacion: clasificacion[portador_trofeo]['Portador'] = True
-    return clasificacion
-
-def calcular_estadisticas_individuales(historial_goles):
-    if not historial_goles: return {}
-    goleadores = Counter(evento['Goleador'] for evento in historial_goles if evento.get('Goleador'))
-    asistentes = Counter(evento['Asistente'] for evento in historial_goles if evento.get('Asistente'))
-    jugadores = set(goleadores.keys()) | set(asistentes.keys())
-    clasificacion_individual = {}
-    for jugador in jugadores:
-        goles = goleadores.get(jugador, 0)
-        asistencias = asistentes.get(jugador, 0)
-        clasificacion_individual[jugador] = {'Goles': goles, 'Asistencias': asistencias, 'G/A': goles + asistencias}
-    return clasificacion_individual
-
-def calcular_estadisticas_porteros(historial_porterias):
-    if not historial_porterias: return {}
-    porteros = Counter(evento['Portero'] for evento in historial_porterias if evento.get('Portero'))
-    return {portero: {'Porterías a 0': count} for portero, count in porteros.items()}
+        informar_error("Error al leer los historiales", e)
+    vincular_sesion()
 
-# --- GESTIÓN DE DATOS ---
-def recargar_y_recalcular_todo():
-    # (Sin cambios aquí, get_all_records() cogerá la nueva columna automáticamente)
-    sh_historial = conectar_a_gsheets("HistorialPartidos")
-    historial = sh_historial.get_all_records() if sh_historial else []
-    st.session_state.clasificacion = calcular_todas_las_estadisticas(historial)
-    st.session_state.historial = historial
-    st.session_state.portador_actual = next((eq for eq, stats in st.session_state.clasificacion.items() if stats.get('Portador')), None)
-    sh_goles = conectar_a_gsheets("HistorialGoles")
-    historial_goles = sh_goles.get_all_records() if sh_goles else []
-    st.session_state.clasificacion_individual = calcular_estadisticas_individuales(historial_goles)
-    st.session_state.historial_goles = historial_goles
-    sh_porterias = conectar_a_gsheets("HistorialPorteriasCero")
-    historial_porterias = sh_porterias.get_all_records() if sh_porterias else []
-    st.session_state.clasificacion_porteros = calcular_estadisticas_porteros(historial_porterias)
-    st.session_state.historial_porterias = historial_porterias
-    st.session_state.app_cargada = True
+def sincronizar_sesion():
+    # Una sesión nueva no hace ninguna llamada a la API si los datos no han cambiado. Tras
+    # reiniciar el proceso se parte de la copia local si el almacén sigue igual o solo tiene filas nuevas
+    try:
+        with metricas.etapa("sincronizar_sesion"):
+            instantanea.comprobar(almacen, HOJAS_HISTORIAL, INTERVALO_COMPROBACION, RUTA_COPIA_LOCAL)
+        instantanea.guardar_copia_si_hace_falta(RUTA_COPIA_LOCAL, INTERVALO_COPIA_LOCAL)
+    except Exception as e:
+        informar_error("Error al comprobar si hay cambios", e)
+    if st.session_state.get('version') != instantanea.version: vincular_sesion()
 
 def guardar_datos_completos():
-    # (Sin cambios aquí, esta función solo guarda la Hoja1 y las de jugadores, no el historial)
-    sh_clasif = conectar_a_gsheets("Hoja1")
-    if sh_clasif:
-        clasif_para_guardar = st.session_state.get('clasificacion', {})
-        encabezados = ["Equipo", "PJ", "V", "E", "D", "P", "PPP", "Partidos con Trofeo", "Mejor Racha", "Intentos", "Destronamientos", "Indice Destronamiento"]
-        datos = [encabezados] + [[eq, s['T'], s['V'], s['E'], s['D'], s['P'], s['PPM'], s['Partidos con Trofeo'], s['Mejor Racha'], s['Intentos'], s['Destronamientos'], s['Indice Destronamiento']] for eq, s in clasif_para_guardar.items()]
-        sh_clasif.clear(); sh_clasif.update(datos, 'A1')
-    sh_goleadores = conectar_a_gsheets("ClasificacionGoleadores")
-    if sh_goleadores:
-        clasif_ind_guardar = st.session_state.get('clasificacion_individual', {})
-        encabezados = ["Jugador", "Goles", "Asistencias", "G/A"]
-        datos = [encabezados] + [[j, s['Goles'], s['Asistencias'], s['G/A']] for j, s in clasif_ind_guardar.items()]
-        sh_goleadores.clear(); sh_goleadores.update(datos, 'A1')
-    sh_porteros = conectar_a_gsheets("ClasificacionPorteros")
-    if sh_porteros:
-        clasif_porteros_guardar = st.session_state.get('clasificacion_porteros', {})
-        encabezados = ["Portero", "Porterías a 0"]
-        datos = [encabezados] + [[p, s['Porterías a 0']] for p, s in clasif_porteros_guardar.items()]
-        sh_porteros.clear(); sh_porteros.update(datos, 'A1')
+    # En Google Sheets solo se envían las celdas que han cambiado respecto a la última
+    # escritura, todas las pestañas juntas en una única petición (ver hojas.escribir_tablas)
+    try:
+        with metricas.etapa("guardar_datos_completos"):
+            almacen.escribir_tablas(instantanea.tablas_derivadas())
+    except Exception as e:
+        informar_error("Error al guardar las clasificaciones", e)
 
 def guardar_evento_historial(sh_name, data_row):
-    # (Sin cambios aquí, esta función es genérica y guardará la fila con más datos)
-    sh = conectar_a_gsheets(sh_name)
-    if sh: sh.append_row(data_row, value_input_option='USER_ENTERED')
-
-# --- CAMBIO AQUÍ ---
-# He hecho esta función más robusta para que funcione con cualquier
-# número de columnas, basándose en los encabezados que se le pasan.
-def reescribir_historial_completo(sh_name, nuevo_historial, encabezados):
-    """Borra la hoja de historial y la reescribe con nuevos datos."""
-    sh = conectar_a_gsheets(sh_name)
-    if sh:
-        datos = [encabezados]
-        for row in nuevo_historial:
-            # Construye la fila basada en el orden de los encabezados
-            # Usar .get() evita errores si una fila antigua no tiene 'ResultadoManual'
-            nueva_fila = [row.get(h, "") for h in encabezados]
-            datos.append(nueva_fila)
-        
-        sh.clear(); sh.update(datos, 'A1')
+    # En Google Sheets el evento queda en el diario local al instante y se sube en segundo plano
+    # Los nombres se guardan con su grafía canónica ("arsenal " -> "Arsenal" si ya existía)
+    # Devuelve None (y muestra el error) si no se ha podido guardar
+    registro = estado.TIPOS_EVENTO[sh_name].de_valores(data_row)
+    try:
+        with metricas.etapa("guardar_evento_historial"), instantanea.lock:
+            almacen.añadir_evento(sh_name, list(registro))
+            registro = instantanea.añadir(sh_name, registro)
+    except Exception as e:
+        informar_error("Error al guardar el registro", e)
+        return None
+    vincular_sesion()
+    return registro
+
+def eliminar_evento_historial(sh_name, indice, registro):
+    # Solo se borra la fila elegida, y solo si sigue conteniendo lo que se mostró al usuario
+    try:
+        with metricas.etapa("eliminar_evento_historial"), instantanea.lock:
+            if not instantanea.contiene(sh_name, indice, registro):
+                raise almacenamiento.ConflictoEdicion()
+            almacen.eliminar_evento(sh_name, indice, registro)
+            instantanea.eliminar(sh_name, indice, registro)
+        vincular_sesion()
+        return True
+    except almacenamiento.ConflictoEdicion as e:
+        st.error(str(e)); recargar_y_recalcular_todo()
+        return False
+    except Exception as e:
+        informar_error("Error al eliminar el registro", e)
+        return False
 
 # --- CARGA INICIAL ---
-if 'app_cargada' not in st.session_state:
-    recargar_y_recalcular_todo()
+sincronizar_sesion()
 
 # --- DEFINICIÓN DE PÁGINAS ---
 def pagina_añadir_partido():
@@ -171,12 +156,14 @@ def pagina_añadir_partido():
         
     if submit:
         equipos = [ganador, perdedor]
-        if not all(equipos) or equipos[0].lower() == equipos[1].lower(): st.error("Introduce dos nombres de equipo válidos y diferentes."); return
-        if portador and portador.lower() not in [e.lower() for e in equipos]: st.error(f"El campeón ({portador}) debe jugar."); return
+        if not all(equipos) or entidades.equipos.mismo(*equipos): st.error("Introduce dos nombres de equipo válidos y diferentes."); return
+        if portador and not any(entidades.equipos.mismo(portador, e) for e in equipos): st.error(f"El campeón ({portador}) debe jugar."); return
         
         resultado_final = "Victoria"
         if tipo_resultado == "Empate":
-            aspirante = equipos[1] if equipos[0].lower() == portador.lower() else equipos[0]
+            # Sin campeón (primer partido) el Equipo A se queda el título, como el ganador de una victoria
+            if not portador: portador = entidades.equipos.canonico(equipos[0])
+            aspirante = equipos[1] if entidades.equipos.mismo(equipos[0], portador) else equipos[0]
             ganador, perdedor, resultado_final = portador, aspirante, "Empate"
             st.warning(f"Empate: {portador} retiene el título y suma 1 punto.")
         
@@ -189,23 +176,22 @@ def pagina_añadir_partido():
             perdedor, 
             resultado_manual_input
         ]
-        guardar_evento_historial("HistorialPartidos", fila_para_guardar)
-        
-        recargar_y_recalcular_todo(); guardar_datos_completos()
+        # Solo se aplica el partido nuevo; no hace falta recargar y recalcular todo el historial
+        if guardar_evento_historial("HistorialPartidos", fila_para_guardar) is None: return
+        guardar_datos_completos()
         st.success("¡Partido registrado!"); st.rerun()
 
-def pagina_mostrar_clasificacion():
-    # (Sin cambios)
-    st.header("📊 Clasificación General de Equipos")
-    clasif = st.session_state.get('clasificacion', {})
-    if not clasif: st.info("Aún no hay datos."); return
+@metricas.etapa("tabla_clasificacion")
+def tabla_clasificacion(clasif, rachas_actuales=None):
     df = pd.DataFrame.from_dict(clasif, orient='index').sort_values(by="P", ascending=False).reset_index().rename(columns={'index': 'Equipo'})
     df.insert(0, 'Pos.', range(1, len(df) + 1))
-    df['Equipo'] = df.apply(lambda row: f"{row['Equipo']} 👑" if row.get('Portador') else row['Equipo'], axis=1)
+    # 'Portador' solo existe para el campeón; en el resto de filas pandas pone NaN, que también es "verdadero"
+    df['Equipo'] = df.apply(lambda row: f"{row['Equipo']} 👑" if row.get('Portador') is True else row['Equipo'], axis=1)
+    if rachas_actuales is not None: df['Racha Actual'] = df['Equipo'].map(lambda eq: rachas_actuales.get(eq.removesuffix(" 👑"), 0))
     df['PPM'] = df['PPM'].map('{:,.2f}'.format)
     df['Indice Destronamiento'] = df['Indice Destronamiento'].map('{:,.2f}%'.format)
     
-    nuevo_orden_display = ["Pos.", "Equipo", "T", "V", "E", "D", "P", "PPM", "Partidos con Trofeo", "Mejor Racha", "Intentos", "Destronamientos", "Indice Destronamiento"]
+    nuevo_orden_display = ["Pos.", "Equipo", "T", "V", "E", "D", "P", "PPM", "Partidos con Trofeo", "Racha Actual", "Mejor Racha", "Intentos", "Destronamientos", "Indice Destronamiento"]
     nuevos_nombres = {
         "T": "PJ", "V": "V", "E": "E", "D": "D", "P": "P", "PPM": "PPP",
         "Partidos con Trofeo": "Partidos con Trofeo", "Mejor Racha": "Mejor Racha",
@@ -214,60 +200,144 @@ def pagina_mostrar_clasificacion():
     
     # Filtramos por las columnas que existen en el dataframe (para evitar errores si falta alguna)
     columnas_existentes = [col for col in nuevo_orden_display if col in df.columns]
-    df_display = df[columnas_existentes].rename(columns=nuevos_nombres)
-    
-    st.dataframe(df_display, hide_index=True)
+    return df[columnas_existentes].rename(columns=nuevos_nombres)
 
+def pagina_mostrar_clasificacion():
+    st.header("📊 Clasificación General de Equipos")
+    clasif = st.session_state.get('clasificacion', {})
+    if not clasif: st.info("Aún no hay datos."); return
+    st.dataframe(tabla_clasificacion(clasif), hide_index=True)
+
+def fecha_de(partido):
+    try: return datetime.strptime(str(partido.get('Fecha', ''))[:10], "%Y-%m-%d").date()
+    except ValueError: return None
+
+def pagina_clasificacion_en_el_tiempo():
+    st.header("⏳ Clasificación en el Tiempo")
+    motor = instantanea.motor
+    total = motor.n_partidos
+    if not total: st.info("Aún no hay datos."); return
+    modo = st.radio("Elegir el momento por:", ("Nº de partido", "Fecha"), horizontal=True)
+    if modo == "Nº de partido":
+        n = st.slider("Partidos jugados", 1, total, total) if total > 1 else 1
+    else:
+        primera, ultima = fecha_de(motor.historial[0]) or datetime.now().date(), fecha_de(motor.historial[-1]) or datetime.now().date()
+        fecha = st.date_input("Fecha", value=ultima, min_value=min(primera, ultima), max_value=max(primera, ultima))
+        # Búsqueda binaria sobre las fechas del historial (ver MotorClasificacion.partidos_hasta)
+        n = motor.partidos_hasta(fecha.strftime("%Y-%m-%d") + " 23:59:59")
+        if not n: st.info("Todavía no se había jugado ningún partido en esa fecha."); return
+    # Se parte del checkpoint más cercano y se aplican como mucho unos cientos de partidos
+    pasado = motor.motor_en(n)
+    lp = motor.historial[n - 1]
+    st.info(f"Tras {n} partido(s), el último el {lp.get('Fecha', '')}: {lp.get('Equipo Ganador', '')} vs {lp.get('Equipo Perdedor', '')}")
+    if pasado.portador_trofeo: st.info(f"Campeón en ese momento: **{pasado.portador_trofeo}** 👑")
+    clasif = pasado.resultado()
+    if not clasif: st.info("Aún no hay datos."); return
+    st.dataframe(tabla_clasificacion(clasif, pasado.rachas_actuales), hide_index=True)
+
+def pagina_cara_a_cara():
+    st.header("🤝 Cara a Cara")
+    # Todo sale del índice que el motor mantiene al aplicar cada partido (no se recorre el historial)
+    h2h = instantanea.motor.cara_a_cara
+    equipos = sorted(instantanea.clasificacion)
+    if len(equipos) < 2: st.info("Aún no hay datos."); return
+    col1, col2 = st.columns(2)
+    equipo_a = col1.selectbox("Equipo", equipos, index=0)
+    equipo_b = col2.selectbox("Rival", [eq for eq in equipos if eq != equipo_a], index=0)
+    balance = h2h.enfrentamiento(equipo_a, equipo_b)
+    c1, c2, c3 = st.columns(3)
+    c1.metric(f"Victorias {equipo_a}", balance['V']); c2.metric("Empates", balance['E']); c3.metric(f"Victorias {equipo_b}", balance['D'])
+    st.write(f"**{equipo_a}** ha retado por el título a {equipo_b} {balance['Retos']} vez/veces y se lo ha quitado {balance['Destronamientos']}; "
+             f"**{equipo_b}** lo ha retado {balance['Retos Recibidos']} vez/veces y se lo ha quitado {balance['Destronado']}.")
+
+    st.subheader("Matriz completa")
+    matrices = {"Victorias (fila sobre columna)": 'victorias', "Empates": 'empates', "Retos por el título (fila retó a columna)": 'retos', "Destronamientos (fila destronó a columna)": 'destronamientos'}
+    eleccion = st.selectbox("Mostrar", list(matrices))
+    nombres, filas = h2h.matriz(matrices[eleccion])
+    df = pd.DataFrame([{'Equipo': a, 'Rival': b, 'Valor': v} for a, fila in zip(nombres, filas) for b, v in zip(nombres, fila)])
+    mapa = alt.Chart(df).mark_rect().encode(
+        x=alt.X('Rival:N', sort=nombres), y=alt.Y('Equipo:N', sort=nombres),
+        color=alt.Color('Valor:Q', scale=alt.Scale(scheme='blues')), tooltip=['Equipo', 'Rival', 'Valor'])
+    st.altair_chart(mapa)
+
+    st.subheader("Quién ha destronado más veces al campeón")
+    nombres, filas = h2h.matriz('destronamientos')
+    ranking = [{'Equipo': eq, 'Destronamientos': sum(fila), 'Víctima más frecuente': nombres[fila.index(max(fila))]} for eq, fila in zip(nombres, filas) if sum(fila)]
+    if not ranking: st.info("Nadie ha destronado todavía al campeón."); return
+    st.dataframe(pd.DataFrame(ranking).sort_values(by="Destronamientos", ascending=False), hide_index=True)
+
+
+# --- VISTAS DE HISTORIAL ---
+# Las páginas de historial y de eliminar trabajan sobre el DataFrame que la instantánea
+# guarda por versión (ver Instantanea.tabla): se filtra de forma vectorizada y solo se
+# pinta la página actual. Las filas se eligen por su ID estable, no por su posición.
+FILTROS_HISTORIAL = {
+    "HistorialPartidos": ("Equipo", ["Equipo Ganador", "Equipo Perdedor"]),
+    "HistorialGoles": ("Jugador", ["Goleador", "Asistente"]),
+    "HistorialPorteriasCero": ("Portero", ["Portero"]),
+}
+TAMAÑOS_PAGINA = (25, 50, 100, 250)
+
+@metricas.etapa("pagina_de_historial")
+def pagina_de_historial(sh_name, clave):
+    """Pinta los filtros y la paginación y devuelve las filas de la página elegida,
+    de la más reciente a la más antigua, indexadas por ID de fila."""
+    etiqueta, columnas = FILTROS_HISTORIAL[sh_name]
+    df, valores = instantanea.tabla(sh_name, columnas)
+    col1, col2, col3 = st.columns([2, 2, 1])
+    elegido = col1.selectbox(etiqueta, valores, index=None, placeholder="Todos", key=f"{clave}_filtro")
+    fechas = col2.date_input("Entre fechas", value=(), format="YYYY-MM-DD", key=f"{clave}_fechas")
+    tamaño = col3.selectbox("Filas por página", TAMAÑOS_PAGINA, key=f"{clave}_tamaño")
+    mascara = None
+    if elegido is not None: mascara = df[columnas].eq(elegido).any(axis=1)
+    if len(fechas) == 2:
+        en_rango = df['_fecha'].between(pd.Timestamp(fechas[0]), pd.Timestamp(fechas[1]) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1))
+        mascara = en_rango if mascara is None else mascara & en_rango
+    filtrado = df if mascara is None else df[mascara]
+    total = len(filtrado)
+    paginas = max(1, -(-total // tamaño))
+    # La clave incluye el número de páginas para que un filtro nuevo no deje la página fuera de rango
+    pagina = st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, value=1, key=f"{clave}_pagina_{paginas}")
+    st.caption(f"{total} registro(s)")
+    fin = total - (pagina - 1) * tamaño
+    return filtrado.iloc[max(0, fin - tamaño):fin].iloc[::-1]
+
+def eliminar_por_id(sh_name, id_fila):
+    encontrado = instantanea.buscar(sh_name, id_fila)
+    if encontrado is None:
+        st.error(str(almacenamiento.ConflictoEdicion())); return False
+    return eliminar_evento_historial(sh_name, *encontrado)
 
 def pagina_historial_partidos():
     st.header("📜 Historial de Partidos")
-    historial = st.session_state.get('historial', [])
-    if not historial: 
+    if not instantanea.historial:
         st.info("No hay partidos registrados.")
         return
-    
-    df_historial = pd.DataFrame(historial)
-    
-    # --- CAMBIO AQUÍ ---
-    # Definimos el orden deseado de las columnas
-    columnas_historial = ["Fecha", "Equipo Ganador", "Resultado", "Equipo Perdedor", "ResultadoManual"]
-    
-    # Filtramos el df para que solo tenga las columnas que queremos, en el orden que queremos
-    columnas_a_mostrar = [col for col in columnas_historial if col in df_historial.columns]
-    df_display = df_historial[columnas_a_mostrar]
-    
-    st.dataframe(df_display.iloc[::-1], hide_index=True) # Ocultamos el índice de pandas
+    filas = pagina_de_historial("HistorialPartidos", "historial_partidos")
+    st.dataframe(filas[["Nº"] + ENCABEZADOS_PARTIDOS], hide_index=True)
 
 def pagina_eliminar_partido():
     st.header("❌ Eliminar un Partido")
-    historial = st.session_state.get('historial', [])
-    if not historial: 
+    if not instantanea.historial:
         st.info("No hay partidos para eliminar.")
         return
+    filas = pagina_de_historial("HistorialPartidos", "eliminar_partido")
+    # Solo se formatean las opciones de la página visible
+    opciones = {}
+    for id_fila, p in filas.to_dict('index').items():
+        res_manual_str = f" ({p['ResultadoManual']})" if p.get('ResultadoManual') else ""
+        opciones[id_fila] = f"Nº{p['Nº']} ({p['Fecha']}): {p['Equipo Ganador']} vs {p['Equipo Perdedor']}{res_manual_str}"
+
+    seleccion = st.selectbox("Selecciona el partido a eliminar:", options=list(opciones), format_func=opciones.get, index=None)
     
-    # --- CAMBIO AQUÍ ---
-    # Mostramos también el ResultadoManual en las opciones si existe
-    opciones = []
-    for i, p in enumerate(historial):
-        res_manual_str = f" ({p.get('ResultadoManual', '')})" if p.get('ResultadoManual') else ""
-        opciones.append(f"Nº{i+1} ({p['Fecha']}): {p['Equipo Ganador']} vs {p['Equipo Perdedor']}{res_manual_str}")
-
-    seleccion = st.selectbox("Selecciona el partido a eliminar:", options=opciones, index=None)
-    
-    if seleccion and st.button("Eliminar Partido Seleccionado"):
-        indice = opciones.index(seleccion)
-        nuevo_historial = [p for i, p in enumerate(historial) if i != indice]
-        
-        # --- CAMBIO AQUÍ ---
-        # Nos aseguramos de pasar la lista de encabezados completa
-        encabezados_historial = ["Fecha", "Equipo Ganador", "Resultado", "Equipo Perdedor", "ResultadoManual"]
-        reescribir_historial_completo("HistorialPartidos", nuevo_historial, encabezados_historial)
+    if seleccion is not None and st.button("Eliminar Partido Seleccionado"):
+        if not eliminar_por_id("HistorialPartidos", seleccion): return
         
-        recargar_y_recalcular_todo(); guardar_datos_completos()
+        # El motor solo rehace los partidos desde el checkpoint anterior al eliminado
+        guardar_datos_completos()
         st.success("¡Partido eliminado!"); st.rerun()
 
 def pagina_añadir_gol():
-    # (Sin cambios)
     st.header("➕ Añadir Gol")
     with st.form(key="gol_form"):
         goleador = st.text_input("Goleador*")
@@ -275,8 +345,8 @@ def pagina_añadir_gol():
         submit = st.form_submit_button("Registrar Gol")
     if submit:
         if not goleador: st.error("El nombre del goleador es obligatorio."); return
-        guardar_evento_historial("HistorialGoles", [datetime.now().strftime("%Y-%m-%d %H:%M:%S"), goleador, asistente or ""])
-        recargar_y_recalcular_todo(); guardar_datos_completos()
+        if guardar_evento_historial("HistorialGoles", [datetime.now().strftime("%Y-%m-%d %H:%M:%S"), goleador, asistente or ""]) is None: return
+        guardar_datos_completos()
         st.success("¡Gol registrado!"); st.rerun()
 
 def pagina_clasificacion_individual():
@@ -288,36 +358,31 @@ def pagina_clasificacion_individual():
     st.dataframe(df)
 
 def pagina_historial_goles():
-    # (Sin cambios)
     st.header("📋 Historial de Goles")
-    historial = st.session_state.get('historial_goles', [])
-    if not historial: st.info("No hay goles registrados."); return
-    st.dataframe(pd.DataFrame(historial).iloc[::-1])
+    if not instantanea.historial_goles: st.info("No hay goles registrados."); return
+    filas = pagina_de_historial("HistorialGoles", "historial_goles")
+    st.dataframe(filas[["Nº"] + ENCABEZADOS_HISTORIAL["HistorialGoles"]], hide_index=True)
 
 def pagina_eliminar_gol():
-    # (Sin cambios)
     st.header("❌ Eliminar un Gol")
-    historial = st.session_state.get('historial_goles', [])
-    if not historial: st.info("No hay goles para eliminar."); return
-    opciones = [f"{p['Fecha']}: Gol de {p['Goleador']}" + (f" (Asis. de {p['Asistente']})" if p.get('Asistente') else "") for p in historial]
-    seleccion = st.selectbox("Selecciona el gol a eliminar:", options=opciones, index=None)
-    if seleccion and st.button("Eliminar Gol Seleccionado"):
-        indice = opciones.index(seleccion)
-        nuevo_historial = [p for i, p in enumerate(historial) if i != indice]
-        reescribir_historial_completo("HistorialGoles", nuevo_historial, ["Fecha", "Goleador", "Asistente"])
-        recargar_y_recalcular_todo(); guardar_datos_completos()
+    if not instantanea.historial_goles: st.info("No hay goles para eliminar."); return
+    filas = pagina_de_historial("HistorialGoles", "eliminar_gol")
+    opciones = {id_fila: f"{p['Fecha']}: Gol de {p['Goleador']}" + (f" (Asis. de {p['Asistente']})" if p.get('Asistente') else "") for id_fila, p in filas.to_dict('index').items()}
+    seleccion = st.selectbox("Selecciona el gol a eliminar:", options=list(opciones), format_func=opciones.get, index=None)
+    if seleccion is not None and st.button("Eliminar Gol Seleccionado"):
+        if not eliminar_por_id("HistorialGoles", seleccion): return
+        guardar_datos_completos()
         st.success("¡Gol eliminado!"); st.rerun()
 
 def pagina_añadir_porteria_cero():
-    # (Sin cambios)
     st.header("🧤 Añadir Portería a 0")
     with st.form(key="portero_form"):
         portero = st.text_input("Nombre del Portero*")
         submit = st.form_submit_button("Registrar Portería a 0")
     if submit:
         if not portero: st.error("El nombre del portero es obligatorio."); return
-        guardar_evento_historial("HistorialPorteriasCero", [datetime.now().strftime("%Y-%m-%d %H:%M:%S"), portero])
-        recargar_y_recalcular_todo(); guardar_datos_completos()
+        if guardar_evento_historial("HistorialPorteriasCero", [datetime.now().strftime("%Y-%m-%d %H:%M:%S"), portero]) is None: return
+        guardar_datos_completos()
         st.success("¡Portería a 0 registrada!"); st.rerun()
 
 def pagina_clasificacion_porteros():
@@ -329,24 +394,20 @@ def pagina_clasificacion_porteros():
     st.dataframe(df)
 
 def pagina_historial_porterias_cero():
-    # (Sin cambios)
     st.header("📋 Historial de Porterías a 0")
-    historial = st.session_state.get('historial_porterias', [])
-    if not historial: st.info("No hay registros."); return
-    st.dataframe(pd.DataFrame(historial).iloc[::-1])
+    if not instantanea.historial_porterias: st.info("No hay registros."); return
+    filas = pagina_de_historial("HistorialPorteriasCero", "historial_porterias")
+    st.dataframe(filas[["Nº"] + ENCABEZADOS_HISTORIAL["HistorialPorteriasCero"]], hide_index=True)
 
 def pagina_eliminar_porteria_cero():
-    # (Sin cambios)
     st.header("❌ Eliminar Portería a 0")
-    historial = st.session_state.get('historial_porterias', [])
-    if not historial: st.info("No hay registros para eliminar."); return
-    opciones = [f"{p['Fecha']}: {p['Portero']}" for p in historial]
-    seleccion = st.selectbox("Selecciona el registro a eliminar:", options=opciones, index=None)
-    if seleccion and st.button("Eliminar Registro Seleccionado"):
-        indice = opciones.index(seleccion)
-        nuevo_historial = [p for i, p in enumerate(historial) if i != indice]
-        reescribir_historial_completo("HistorialPorteriasCero", nuevo_historial, ["Fecha", "Portero"])
-        recargar_y_recalcular_todo(); guardar_datos_completos()
+    if not instantanea.historial_porterias: st.info("No hay registros para eliminar."); return
+    filas = pagina_de_historial("HistorialPorteriasCero", "eliminar_porteria")
+    opciones = {id_fila: f"{p['Fecha']}: {p['Portero']}" for id_fila, p in filas.to_dict('index').items()}
+    seleccion = st.selectbox("Selecciona el registro a eliminar:", options=list(opciones), format_func=opciones.get, index=None)
+    if seleccion is not None and st.button("Eliminar Registro Seleccionado"):
+        if not eliminar_por_id("HistorialPorteriasCero", seleccion): return
+        guardar_datos_completos()
         st.success("¡Registro eliminado!"); st.rerun()
 
 def pagina_borrar_datos():
@@ -364,15 +425,88 @@ def pagina_borrar_datos():
                 "ClasificacionPorteros": ["Portero", "Porterías a 0"],
                 "HistorialPorteriasCero": ["Fecha", "Portero"]
             }
-            for nombre_hoja, encabezados in sheets_a_limpiar.items():
-                sh = conectar_a_gsheets(nombre_hoja)
-                if sh: sh.clear(); sh.update([encabezados], 'A1')
+            try:
+                with instantanea.lock:
+                    almacen.reiniciar(sheets_a_limpiar)
+                    # Ni las importaciones a medias ni las grafías de los nombres borrados siguen valiendo
+                    importacion.olvidar_importaciones(RUTA_ESTADO_IMPORTACION)
+                    entidades.equipos.vaciar(); entidades.jugadores.vaciar()
+            except Exception as e:
+                informar_error("Error al borrar los datos", e); return
+            recargar_y_recalcular_todo()
             st.session_state.clear()
             st.success("¡Todos los datos han sido borrados!"); st.rerun()
         else: st.error("Confirmación incorrecta.")
 
+def pagina_importar():
+    st.header("📥 Importar Datos")
+    tipos = {"Partidos": "HistorialPartidos", "Goles": "HistorialGoles", "Porterías a 0": "HistorialPorteriasCero"}
+    tipo = st.radio("¿Qué quieres importar?", list(tipos), horizontal=True)
+    sh_name = tipos[tipo]
+    st.caption(f"Un CSV o Excel con una fila de encabezados: {', '.join(ENCABEZADOS_HISTORIAL[sh_name])}. "
+               "Se valida todo el fichero antes de subir nada; los partidos deben ir en orden de fecha y el campeón debe jugar en cada uno. "
+               "Si la importación se corta, vuelve a importar el mismo fichero y seguirá donde se quedó.")
+    fichero = st.file_uploader("Fichero", type=["csv", "xlsx"])
+    if fichero is None or not st.button("Importar"): return
+    barra = st.progress(0.0, text="Validando...")
+    def progreso(fase, hechas, total):
+        barra.progress(hechas / total if total else 0.0, text=f"{fase}... {hechas}" + (f" / {total}" if total else ""))
+    try:
+        with metricas.etapa("importar"):
+            resultado = importacion.importar(almacen, instantanea, sh_name, fichero, fichero.name, RUTA_ESTADO_IMPORTACION, progreso)
+    except importacion.ErrorImportacion as e:
+        st.error(str(e)); return
+    except Exception as e:
+        # Lo subido hasta el fallo ya está en el almacén: se recarga para verlo y se podrá reanudar
+        informar_error("Error al importar", e); recargar_y_recalcular_todo(); return
+    if resultado['errores']:
+        st.error(f"No se ha importado nada: {len(resultado['errores'])} fila(s) con errores.")
+        for error in resultado['errores'][:50]: st.write(error)
+        return
+    # Las clasificaciones se guardan una sola vez, con todo lo importado
+    guardar_datos_completos()
+    vincular_sesion()
+    reanudada = f" (continuando desde la fila {resultado['reanudada_desde'] + 1})" if resultado['reanudada_desde'] else ""
+    st.success(f"¡{resultado['importadas']} registro(s) importados{reanudada}!")
+
+def pagina_rendimiento():
+    st.header("📈 Rendimiento")
+    datos = metricas.resumen()
+    st.caption(f"Desde {datetime.fromtimestamp(datos['desde']).strftime('%Y-%m-%d %H:%M:%S')}. Los percentiles son sobre las últimas {metricas.MUESTRAS_POR_ETAPA} muestras de cada etapa.")
+    arranque = instantanea.arranque
+    if arranque and arranque['modo'] == 'copia': st.caption(f"Arranque desde la copia local, con {arranque['filas_nuevas']} fila(s) nuevas leídas del almacén.")
+    elif arranque: st.caption(f"Arranque con recarga completa{' (' + arranque['motivo'] + ')' if arranque['motivo'] else ''}.")
+    if instantanea.error_copia: st.warning(f"No se pudo guardar la copia local: {instantanea.error_copia}")
+
+    st.subheader("Cuota de la API (último minuto)")
+    columnas = st.columns(len(metricas.CUOTA_POR_MINUTO) + 1)
+    for col, (tipo, cuota) in zip(columnas, metricas.CUOTA_POR_MINUTO.items()):
+        usadas = datos['ultimo_minuto'][tipo]
+        col.metric(f"Peticiones de {tipo}", f"{usadas} / {cuota}", f"quedan {datos['cuota_restante'][tipo]}", delta_color="off")
+        col.progress(min(usadas / cuota, 1.0))
+    columnas[-1].metric("Peticiones a Drive", datos['ultimo_minuto']['drive'])
+    por_minuto = pd.DataFrame([{'Minuto': minuto, **{t: c.get(t, 0) for t in ('lectura', 'escritura', 'drive')}} for minuto, c in metricas.peticiones_por_minuto()]).set_index('Minuto')
+    st.bar_chart(por_minuto)
+
+    st.subheader("Etapas")
+    if not datos['etapas']: st.info("Aún no hay medidas.")
+    else:
+        df = pd.DataFrame.from_dict(datos['etapas'], orient='index').sort_values(by="p95_s", ascending=False)
+        df = df[['n', 'p50_s', 'p95_s', 'max_s', 'ultimo_s']].rename(columns={'n': 'Veces', 'p50_s': 'p50 (ms)', 'p95_s': 'p95 (ms)', 'max_s': 'Máx. (ms)', 'ultimo_s': 'Última (ms)'})
+        df.iloc[:, 1:] = (df.iloc[:, 1:] * 1000).round(1)
+        st.dataframe(df.rename_axis('Etapa').reset_index(), hide_index=True)
+
+    st.subheader("Peticiones por pestaña")
+    if datos['peticiones_por_hoja']:
+        st.dataframe(pd.DataFrame.from_dict(datos['peticiones_por_hoja'], orient='index').fillna(0).astype(int).rename_axis('Pestaña').reset_index(), hide_index=True)
+    for e in datos['errores']: st.warning(f"{e['metodo']}: {e['n']} error(es) {e['codigo']}")
+
+    col1, col2, col3 = st.columns(3)
+    col1.download_button("Descargar JSON", metricas.a_json(), file_name="metricas_tonoi.json", mime="application/json")
+    col2.download_button("Descargar Prometheus", metricas.a_prometheus(), file_name="metricas_tonoi.prom", mime="text/plain")
+    if col3.button("Reiniciar métricas"): metricas.reiniciar(); st.rerun()
+
 # --- MENÚ PRINCIPAL Y ROUTER ---
-# (Sin cambios en esta sección)
 st.set_page_config(page_title="ToNOI", page_icon="👑", layout="wide")
 st.title("👑 Torneo No Oficial de Inglaterra (ToNOI)")
 
@@ -383,6 +517,8 @@ with st.sidebar:
     st.header("Torneo de Equipos")
     if st.button("Añadir Partido"): st.session_state.active_page = "Añadir Partido"
     if st.button("Clasificación General"): st.session_state.active_page = "Clasificación General"
+    if st.button("Clasificación en el Tiempo"): st.session_state.active_page = "Clasificación en el Tiempo"
+    if st.button("Cara a Cara"): st.session_state.active_page = "Cara a Cara"
     if st.button("Historial de Partidos"): st.session_state.active_page = "Historial de Partidos"
     if st.button("Eliminar Partido"): st.session_state.active_page = "Eliminar Partido"
     
@@ -397,17 +533,30 @@ with st.sidebar:
     with st.expander("Porterías a 0"):
         if st.button("Añadir Portería a 0"): st.session_state.active_page = "Añadir Portería a 0"
         if st.button("Clasificación Porteros"): st.session_state.active_page = "Clasificación Porteros"
-        if st.button("Historial de Porterías a 0"): st.session_state.active_page = "Historial Porterías a 0"
+        if st.button("Historial de Porterías a 0"): st.session_state.active_page = "Historial de Porterías a 0"
         if st.button("Eliminar Portería a 0"): st.session_state.active_page = "Eliminar Portería a 0"
 
     st.markdown("---")
     st.header("Administración")
+    if st.button("📥 Importar Datos"): st.session_state.active_page = "Importar"
+    if st.button("📈 Rendimiento"): st.session_state.active_page = "Rendimiento"
     if st.button("🗑️ Borrar Todos los Datos"): st.session_state.active_page = "Borrar Todo"
+    if almacen.pendientes(): st.caption(f"Eventos pendientes de subir: {len(almacen.pendientes())}")
+    errores_copia = almacen.errores()
+    if errores_copia:
+        st.warning(f"Google Sheets no está al día: {len(errores_copia)} operación(es) fallida(s). Última: {errores_copia[-1]}")
+        if hasattr(almacen, 'resincronizar') and st.button("🔁 Volver a copiar a Google Sheets"):
+            # Con el lock, para que no entre ningún evento entre la lectura de SQLite y la copia
+            with instantanea.lock: almacen.resincronizar()
+            st.info("Copiando los historiales en segundo plano.")
+    if MODO_ALMACEN != "sqlite": st.caption(f"Caché de hojas: {hojas.estadisticas['aciertos']} aciertos / {hojas.estadisticas['fallos']} fallos / {hojas.estadisticas['reconexiones']} reconexiones")
 
 # Ejecuta la página que está activa en la sesión
 page_map = {
     "Añadir Partido": pagina_añadir_partido,
     "Clasificación General": pagina_mostrar_clasificacion,
+    "Clasificación en el Tiempo": pagina_clasificacion_en_el_tiempo,
+    "Cara a Cara": pagina_cara_a_cara,
     "Historial de Partidos": pagina_historial_partidos,
     "Eliminar Partido": pagina_eliminar_partido,
     "Añadir Gol": pagina_añadir_gol,
@@ -418,6 +567,8 @@ page_map = {
     "Clasificación Porteros": pagina_clasificacion_porteros,
     "Historial de Porterías a 0": pagina_historial_porterias_cero,
     "Eliminar Portería a 0": pagina_eliminar_porteria_cero,
+    "Importar": pagina_importar,
+    "Rendimiento": pagina_rendimiento,
     "Borrar Todo": pagina_borrar_datos,
 }
 
@@ -426,4 +577,10 @@ if pagina_actual not in page_map:
     st.session_state.active_page = "Añadir Partido" # Vuelve a la página por defecto
     pagina_actual = "Añadir Partido"
 
-page_map[pagina_actual]()
\ No newline at end of file
+try:
+    with metricas.etapa(f"pagina: {pagina_actual}"):
+        page_map[pagina_actual]()
+finally:
+    # También cuando la página termina con st.rerun() (que es una excepción), como al registrar un partido
+    metricas.registrar("rerun", time.perf_counter() - inicio_rerun)
+    if RUTA_METRICAS: metricas.escribir_prometheus(RUTA_METRICAS)
\ No newline at end of file
@@ -0,0 +1 @@
+# Benchmarks sin conexión: `python -m benchmarks.ejecutar --help`
@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+import almacenamiento
+import estado
+import hojas
+from motor import MotorClasificacion, calcular_todas_las_estadisticas, calcular_estadisticas_individuales, calcular_estadisticas_porteros
+from motor_vectorizado import clasificacion_vectorizada, goleadores_vectorizado
+from benchmarks.generador import generar_torneo, a_registros
+from benchmarks.hojas_falsas import LibroFalso
+
+# --- BENCHMARKS SIN CONEXIÓN ---
+# Mide los cálculos y los flujos de la app (registrar, eliminar, recargar, guardar las
+# clasificaciones) sobre torneos sintéticos de distintos tamaños, contra el Google Sheets
+# falso o contra SQLite. Los flujos hacen las mismas llamadas que las funciones de app.py
+# (guardar_evento_historial, eliminar_evento_historial, recargar_y_recalcular_todo y
+# guardar_datos_completos), que no se pueden importar sin Streamlit.
+#
+#   python -m benchmarks.ejecutar --tamaños 1000 10000 100000 --salida resultados.json
+#   python -m benchmarks.ejecutar --tamaños 1000 --comparar resultados.json
+
+HOJAS_HISTORIAL = list(estado.ENCABEZADOS_HISTORIAL)
+HOJAS_DERIVADAS = ("Hoja1", "ClasificacionGoleadores", "ClasificacionPorteros")
+# Un flujo es más lento que en la ejecución de referencia si tarda más de este factor
+UMBRAL_REGRESION = 1.2
+# ...y al menos estos segundos (por debajo, la diferencia es ruido)
+RUIDO_MINIMO_S = 0.005
+
+def _diferencia(antes, despues):
+    llamadas = {m: n - antes['llamadas'].get(m, 0) for m, n in despues['llamadas'].items() if n != antes['llamadas'].get(m, 0)}
+    return {'llamadas': llamadas, 'total_llamadas': sum(llamadas.values()),
+            'bytes_enviados': despues['bytes_enviados'] - antes['bytes_enviados'],
+            'bytes_recibidos': despues['bytes_recibidos'] - antes['bytes_recibidos'],
+            'latencia_simulada_s': round(despues['latencia_simulada_s'] - antes['latencia_simulada_s'], 3)}
+
+def medir(funcion, contador=None, memoria=True):
+    """Ejecuta `funcion()` una vez para el tiempo y las llamadas a la API y, si `memoria`,
+    otra vez bajo tracemalloc para el pico de memoria (tracemalloc ralentiza mucho y
+    falsearía el tiempo). Por eso los flujos tienen que poder repetirse."""
+    antes = contador.resumen() if contador else None
+    propio = contador.tiempo_propio if contador else 0.0
+    inicio = time.perf_counter()
+    funcion()
+    # No se cuenta lo que tarda el Google Sheets falso en contar bytes
+    resultado = {'tiempo_s': round(time.perf_counter() - inicio - ((contador.tiempo_propio - propio) if contador else 0.0), 6)}
+    if contador: resultado['api'] = _diferencia(antes, contador.resumen())
+    if memoria:
+        tracemalloc.start()
+        try:
+            funcion()
+            resultado['pico_memoria_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 3)
+        finally:
+            tracemalloc.stop()
+    return resultado
+
+def preparar_almacen(tipo, filas, carpeta):
+    """Almacén ya cargado con el torneo. Devuelve (almacen, contador), con contador None en SQLite."""
+    if tipo == "sqlite":
+        almacen = almacenamiento.AlmacenSQLite(os.path.join(carpeta, f"bench-{time.monotonic_ns()}.sqlite3"), estado.ENCABEZADOS_HISTORIAL)
+        for nombre_hoja, filas_hoja in filas.items(): almacen.añadir_eventos(nombre_hoja, filas_hoja)
+        return almacen, None
+    contenido = {nombre: [estado.ENCABEZADOS_HISTORIAL[nombre]] + filas[nombre] for nombre in HOJAS_HISTORIAL}
+    contenido.update({nombre: [] for nombre in HOJAS_DERIVADAS})
+    libro = LibroFalso(contenido)
+    hojas.usar_libro(libro)
+    return almacenamiento.AlmacenGSheets(estado.ENCABEZADOS_HISTORIAL, os.path.join(carpeta, "cola_eventos.jsonl")), libro.contador
+
+def _esperar_subida(almacen):
+    # En Google Sheets el evento se sube en segundo plano; se espera para contar su append_rows
+    cola_escritura = getattr(almacen, 'cola', None)
+    if cola_escritura is not None: cola_escritura.vaciar()
+
+def flujos(almacen, instantanea, ruta_copia):
+    """Los flujos de la app como funciones sin argumentos que se pueden repetir."""
+    def guardar_datos_completos():
+        almacen.escribir_tablas(instantanea.tablas_derivadas())
+
+    def registrar(nombre_hoja, fila):
+        registro = dict(zip(estado.ENCABEZADOS_HISTORIAL[nombre_hoja], fila))
+        with instantanea.lock:
+            almacen.añadir_evento(nombre_hoja, fila)
+            instantanea.añadir(nombre_hoja, registro)
+        guardar_datos_completos()
+        _esperar_subida(almacen)
+
+    def registrar_partido():
+        portador = instantanea.portador_actual or "Equipo 00"
+        aspirante = next(eq for eq in instantanea.clasificacion if eq != portador)
+        registrar("HistorialPartidos", [datetime.now().strftime("%Y-%m-%d %H:%M:%S"), portador, "Victoria", aspirante, "1-0"])
+
+    def eliminar(nombre_hoja):
+        # Se elimina una fila de la mitad: en el motor incremental es el caso típico, no el mejor
+        historial = instantanea._historial_de(nombre_hoja)
+        indice = len(historial) // 2
+        with instantanea.lock:
+            registro = historial[indice]
+            almacen.eliminar_evento(nombre_hoja, indice, registro)
+            instantanea.eliminar(nombre_hoja, indice, registro)
+        guardar_datos_completos()
+
+    def guardar_por_primera_vez():
+        # Como al arrancar el proceso: no se sabe qué hay escrito y se lee antes de comparar
+        hojas.olvidar_tablas()
+        guardar_datos_completos()
+
+    fecha = lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return {
+        'recargar_y_recalcular_todo': lambda: instantanea.recargar(almacen, HOJAS_HISTORIAL),
+        # Sin cambios desde la recarga: solo cuesta la llamada que devuelve la marca de modificación
+        'comprobar_cambios': lambda: instantanea.comprobar(almacen, HOJAS_HISTORIAL, intervalo=0),
+        # Arranque en frío con la copia local al día: en Google Sheets basta con la marca de
+        # modificación; en SQLite se leen los historiales y se comparan con la huella de la copia
+        'guardar_copia_local': lambda: instantanea.guardar_copia(ruta_copia),
+        'arrancar_desde_copia_local': lambda: estado.Instantanea().arrancar(almacen, HOJAS_HISTORIAL, ruta_copia),
+        'guardar_datos_completos_inicial': guardar_por_primera_vez,
+        'guardar_datos_completos_sin_cambios': guardar_datos_completos,
+        'registrar_partido': registrar_partido,
+        'registrar_gol': lambda: registrar("HistorialGoles", [fecha(), "Equipo 00 J01", "Equipo 00 J02"]),
+        'registrar_porteria_cero': lambda: registrar("HistorialPorteriasCero", [fecha(), "Equipo 00 POR"]),
+        'eliminar_partido': lambda: eliminar("HistorialPartidos"),
+        'eliminar_gol': lambda: eliminar("HistorialGoles"),
+        'eliminar_porteria_cero': lambda: eliminar("HistorialPorteriasCero"),
+    }
+
+def ejecutar_tamaño(n_partidos, semilla, tipo_almacen, carpeta, memoria=True):
+    inicio = time.perf_counter()
+    filas = generar_torneo(n_partidos, semilla)
+    generacion = time.perf_counter() - inicio
+    registros = {nombre: a_registros(filas[nombre], estado.ENCABEZADOS_HISTORIAL[nombre]) for nombre in HOJAS_HISTORIAL}
+    partidos, goles, porterias = (registros[n] for n in HOJAS_HISTORIAL)
+    resultado = {'filas': {nombre: len(f) for nombre, f in filas.items()}, 'generacion_s': round(generacion, 3), 'calculos': {}, 'flujos': {}}
+    calculos = {
+        'calcular_todas_las_estadisticas': lambda: calcular_todas_las_estadisticas(partidos),
+        'calcular_estadisticas_individuales': lambda: calcular_estadisticas_individuales(goles),
+        'calcular_estadisticas_porteros': lambda: calcular_estadisticas_porteros(porterias),
+        'motor_incremental_carga': lambda: MotorClasificacion(partidos),
+        'clasificacion_vectorizada': lambda: clasificacion_vectorizada(partidos),
+        'goleadores_vectorizado': lambda: goleadores_vectorizado(goles),
+    }
+    for nombre, funcion in calculos.items():
+        resultado['calculos'][nombre] = medir(funcion, memoria=memoria)
+    del registros, partidos, goles, porterias
+    almacen, contador = preparar_almacen(tipo_almacen, filas, carpeta)
+    del filas
+    instantanea = estado.Instantanea()
+    ruta_copia = os.path.join(carpeta, f"copia-{time.monotonic_ns()}.bin")
+    for nombre, funcion in flujos(almacen, instantanea, ruta_copia).items():
+        resultado['flujos'][nombre] = medir(funcion, contador, memoria=memoria)
+    return resultado
+
+def comparar(actual, referencia):
+    """Imprime, para cada tamaño y medida presente en ambas ejecuciones, el cociente de tiempos."""
+    regresiones = 0
+    for tamaño, datos in actual['resultados'].items():
+        anterior = referencia.get('resultados', {}).get(tamaño)
+        if not anterior: continue
+        for grupo in ('calculos', 'flujos'):
+            for nombre, medida in datos[grupo].items():
+                previa = anterior.get(grupo, {}).get(nombre)
+                if not previa or not previa['tiempo_s']: continue
+                cociente = medida['tiempo_s'] / previa['tiempo_s']
+                llamadas = (medida.get('api', {}).get('total_llamadas'), previa.get('api', {}).get('total_llamadas'))
+                lento = cociente > UMBRAL_REGRESION and medida['tiempo_s'] - previa['tiempo_s'] > RUIDO_MINIMO_S
+                marca = "  <-- REGRESIÓN" if lento or llamadas[0] != llamadas[1] else ""
+                regresiones += bool(marca)
+                print(f"{tamaño:>9} {nombre:<40} {previa['tiempo_s']:>10.4f}s -> {medida['tiempo_s']:>10.4f}s ({cociente:5.2f}x) API {llamadas[1]} -> {llamadas[0]}{marca}")
+    return regresiones
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Benchmarks sin conexión de ToNOI.")
+    parser.add_argument("--tamaños", type=int, nargs="+", default=[1000, 10000, 100000], help="Número de partidos de cada torneo (hasta 1000000)")
+    parser.add_argument("--semilla", type=int, default=2024)
+    parser.add_argument("--almacen", choices=("gsheets", "sqlite"), default="gsheets", help="Google Sheets falso en memoria o SQLite en una carpeta temporal")
+    parser.add_argument("--sin-memoria", action="store_true", help="No medir el pico de memoria (cada medida se ejecuta una sola vez)")
+    parser.add_argument("--salida", default="resultados_benchmark.json")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior con la que comparar los tiempos")
+    args = parser.parse_args(argumentos)
+
+    informe = {'fecha': datetime.now().isoformat(timespec="seconds"), 'python': platform.python_version(), 'plataforma': platform.platform(),
+               'semilla': args.semilla, 'almacen': args.almacen, 'resultados': {}}
+    carpeta = tempfile.mkdtemp(prefix="tonoi-bench-")
+    try:
+        for n in args.tamaños:
+            print(f"Torneo de {n} partidos...", flush=True)
+            resultado = ejecutar_tamaño(n, args.semilla, args.almacen, carpeta, memoria=not args.sin_memoria)
+            informe['resultados'][str(n)] = resultado
+            for grupo in ('calculos', 'flujos'):
+                for nombre, medida in resultado[grupo].items():
+                    api = f"  API {medida['api']['total_llamadas']} llamadas, {medida['api']['bytes_enviados'] + medida['api']['bytes_recibidos']} B" if 'api' in medida else ""
+                    memoria = f"  {medida['pico_memoria_mb']:.1f} MB" if 'pico_memoria_mb' in medida else ""
+                    print(f"  {nombre:<40} {medida['tiempo_s']:>10.4f}s{memoria}{api}")
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    print(f"Resultados en {args.salida}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            return 1 if comparar(informe, json.load(f)) else 0
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
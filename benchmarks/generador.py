@@ -0,0 +1,47 @@
+import random
+from datetime import datetime, timedelta
+
+# --- GENERADOR DE TORNEOS SINTÉTICOS ---
+# Historiales con la misma forma que los que escribe la app: el campeón juega todos los
+# partidos (como exige la página "Añadir Partido"), los empates los "gana" el portador,
+# y cada partido trae sus goles (con y sin asistencia) y sus porterías a 0.
+
+def generar_torneo(n_partidos, semilla=0, n_equipos=20, jugadores_por_equipo=11):
+    """Devuelve {nombre_hoja: [fila, ...]} con filas en el orden de ENCABEZADOS_HISTORIAL.
+
+    Con la misma semilla se obtiene siempre el mismo torneo. Salen unos 1,4 goles y
+    0,5 porterías a 0 por partido, así que un torneo de 1M de partidos tiene más de 2M de filas."""
+    azar = random.Random(semilla)
+    equipos = [f"Equipo {i:02d}" for i in range(n_equipos)]
+    jugadores = {eq: [f"{eq} J{j:02d}" for j in range(1, jugadores_por_equipo + 1)] for eq in equipos}
+    partidos, goles, porterias = [], [], []
+    fecha = datetime(2020, 1, 1, 18, 0, 0)
+    portador = azar.choice(equipos)
+    for _ in range(n_partidos):
+        fecha += timedelta(minutes=azar.randint(20, 600))
+        texto_fecha = fecha.strftime("%Y-%m-%d %H:%M:%S")
+        aspirante = azar.choice([eq for eq in equipos if eq != portador]) if n_equipos > 1 else portador
+        tirada = azar.random()
+        if tirada < 0.2:
+            ganador, perdedor, resultado = portador, aspirante, "Empate"
+            goles_ganador = goles_perdedor = azar.choice((0, 0, 1, 1, 2))
+        else:
+            # El aspirante gana un tercio de las veces que no hay empate: el trofeo va cambiando de manos
+            ganador, perdedor = (aspirante, portador) if tirada < 0.45 else (portador, aspirante)
+            resultado = "Victoria"
+            goles_perdedor = azar.choice((0, 0, 0, 1, 1, 2))
+            goles_ganador = goles_perdedor + azar.choice((1, 1, 2))
+        partidos.append([texto_fecha, ganador, resultado, perdedor, f"{goles_ganador}-{goles_perdedor}"])
+        for equipo, n_goles in ((ganador, goles_ganador), (perdedor, goles_perdedor)):
+            for _ in range(n_goles):
+                goleador = azar.choice(jugadores[equipo])
+                # Tres de cada diez goles sin asistencia (la columna queda vacía, como en la app)
+                asistente = azar.choice([j for j in jugadores[equipo] if j != goleador]) if azar.random() < 0.7 else ""
+                goles.append([texto_fecha, goleador, asistente])
+        for equipo, recibidos in ((ganador, goles_perdedor), (perdedor, goles_ganador)):
+            if recibidos == 0: porterias.append([texto_fecha, f"{equipo} POR"])
+        if resultado == "Victoria": portador = ganador
+    return {"HistorialPartidos": partidos, "HistorialGoles": goles, "HistorialPorteriasCero": porterias}
+
+def a_registros(filas, encabezados):
+    return [dict(zip(encabezados, fila)) for fila in filas]
@@ -0,0 +1,167 @@
+import json
+import threading
+import time
+from collections import Counter
+import gspread
+from gspread.utils import a1_to_rowcol
+
+# --- GOOGLE SHEETS FALSO EN MEMORIA ---
+# Imita las partes de gspread.Spreadsheet y gspread.Worksheet que usan hojas.py y
+# almacenamiento.py, y cuenta cada llamada como si fuera una petición a la API: cuántas,
+# cuántos bytes van y vuelven (JSON del cuerpo) y cuánta latencia habría añadido la red.
+
+class ContadorAPI:
+    """Llamadas por método, bytes y latencia simulada. Con `dormir=True` la latencia se espera de verdad."""
+
+    def __init__(self, latencia_base=0.15, latencia_por_kb=0.002, dormir=False):
+        self.latencia_base = latencia_base
+        self.latencia_por_kb = latencia_por_kb
+        self.dormir = dormir
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.llamadas = Counter()
+        self.bytes_enviados = 0
+        self.bytes_recibidos = 0
+        self.latencia = 0.0
+        self.tiempo_propio = 0.0
+
+    def registrar(self, metodo, enviado=None, recibido=None):
+        inicio = time.perf_counter()
+        enviados = len(json.dumps(enviado, ensure_ascii=False).encode("utf-8")) if enviado is not None else 0
+        recibidos = len(json.dumps(recibido, ensure_ascii=False).encode("utf-8")) if recibido is not None else 0
+        espera = self.latencia_base + self.latencia_por_kb * (enviados + recibidos) / 1024
+        with self._lock:
+            self.llamadas[metodo] += 1
+            self.bytes_enviados += enviados
+            self.bytes_recibidos += recibidos
+            self.latencia += espera
+            # Lo que tarda el propio contador (serializar a JSON) no es tiempo de la app
+            self.tiempo_propio += time.perf_counter() - inicio
+        if self.dormir: time.sleep(espera)
+
+    def resumen(self):
+        with self._lock:
+            return {'llamadas': dict(self.llamadas), 'total_llamadas': sum(self.llamadas.values()),
+                    'bytes_enviados': self.bytes_enviados, 'bytes_recibidos': self.bytes_recibidos,
+                    'latencia_simulada_s': round(self.latencia, 3)}
+
+def _separar_rango(rango):
+    # "'Hoja 1'!A1:B2" -> ("Hoja 1", "A1:B2"); "'Hoja 1'" -> ("Hoja 1", None)
+    if rango.startswith("'"):
+        fin = 1
+        while True:
+            fin = rango.index("'", fin)
+            if rango[fin + 1:fin + 2] == "'": fin += 2; continue
+            break
+        nombre, resto = rango[1:fin].replace("''", "'"), rango[fin + 1:]
+        return nombre, resto[1:] if resto.startswith("!") else None
+    nombre, _, a1 = rango.partition("!")
+    return nombre, a1 or None
+
+def _recortar(filas):
+    # Sheets no devuelve las celdas vacías del final de cada fila ni las filas vacías del final
+    filas = [list(f) for f in filas]
+    for f in filas:
+        while f and f[-1] == "": f.pop()
+    while filas and not filas[-1]: filas.pop()
+    return filas
+
+class LibroFalso:
+    """Equivale a `gspread.Spreadsheet`. `contenido` es {nombre_pestaña: [fila, ...]} con los encabezados en la primera fila."""
+
+    def __init__(self, contenido, contador=None):
+        self.contador = contador or ContadorAPI()
+        self._lock = threading.RLock()
+        self._celdas = {nombre: [[str(v) for v in fila] for fila in filas] for nombre, filas in contenido.items()}
+        self._modificaciones = 0
+
+    def _modificado(self):
+        self._modificaciones += 1
+
+    def worksheet(self, nombre_hoja):
+        self.contador.registrar('worksheet', recibido={'title': nombre_hoja})
+        if nombre_hoja not in self._celdas: raise gspread.exceptions.WorksheetNotFound(nombre_hoja)
+        return HojaFalsa(self, nombre_hoja)
+
+    def values_batch_get(self, ranges, params=None):
+        with self._lock:
+            rangos = []
+            for rango in ranges:
+                nombre, a1 = _separar_rango(rango)
+                if nombre not in self._celdas: raise gspread.exceptions.WorksheetNotFound(nombre)
+                if a1 is not None: raise NotImplementedError("El libro falso solo lee pestañas completas")
+                rangos.append({'range': rango, 'majorDimension': 'ROWS', 'values': _recortar(self._celdas[nombre])})
+        respuesta = {'valueRanges': rangos}
+        self.contador.registrar('values_batch_get', enviado=list(ranges), recibido=respuesta)
+        return respuesta
+
+    def values_batch_update(self, body):
+        self.contador.registrar('values_batch_update', enviado=body)
+        with self._lock:
+            for bloque in body.get('data', []):
+                nombre, a1 = _separar_rango(bloque['range'])
+                fila, col = a1_to_rowcol(a1.split(":")[0])
+                self._escribir(nombre, fila, col, bloque['values'])
+            self._modificado()
+        return {'totalUpdatedCells': sum(len(f) for b in body.get('data', []) for f in b['values'])}
+
+    def _escribir(self, nombre, fila, col, valores):
+        celdas = self._celdas[nombre]
+        for r, valores_fila in enumerate(valores, start=fila - 1):
+            while len(celdas) <= r: celdas.append([])
+            destino = celdas[r]
+            if len(destino) < col - 1 + len(valores_fila): destino.extend([""] * (col - 1 + len(valores_fila) - len(destino)))
+            destino[col - 1:col - 1 + len(valores_fila)] = [str(v) for v in valores_fila]
+
+    def get_lastUpdateTime(self):
+        marca = f"modificacion-{self._modificaciones}"
+        self.contador.registrar('get_lastUpdateTime', recibido=marca)
+        return marca
+
+class HojaFalsa:
+    """Equivale a `gspread.Worksheet` (solo los métodos que usa la app)."""
+
+    def __init__(self, libro, nombre_hoja):
+        self.libro = libro
+        self.title = nombre_hoja
+
+    @property
+    def _celdas(self):
+        return self.libro._celdas[self.title]
+
+    def append_rows(self, values, value_input_option='RAW', **opciones):
+        self.libro.contador.registrar('append_rows', enviado=values)
+        with self.libro._lock:
+            # Como en Sheets, se añade tras la última fila con datos
+            celdas = self._celdas
+            while celdas and not any(celdas[-1]): celdas.pop()
+            celdas.extend([str(v) for v in fila] for fila in values)
+            self.libro._modificado()
+        return {'updates': {'updatedRows': len(values)}}
+
+    def row_values(self, row, **opciones):
+        with self.libro._lock:
+            valores = _recortar([self._celdas[row - 1]])[0] if row <= len(self._celdas) and any(self._celdas[row - 1]) else []
+        self.libro.contador.registrar('row_values', enviado=row, recibido=valores)
+        return valores
+
+    def delete_rows(self, start_index, end_index=None):
+        self.libro.contador.registrar('delete_rows', enviado=[start_index, end_index])
+        with self.libro._lock:
+            del self._celdas[start_index - 1:(end_index or start_index)]
+            self.libro._modificado()
+
+    def clear(self):
+        self.libro.contador.registrar('clear')
+        with self.libro._lock:
+            self._celdas.clear()
+            self.libro._modificado()
+
+    def update(self, values=None, range_name=None, **opciones):
+        self.libro.contador.registrar('update', enviado=values)
+        with self.libro._lock:
+            fila, col = a1_to_rowcol((range_name or "A1").split(":")[0])
+            self.libro._escribir(self.title, fila, col, values)
+            self.libro._modificado()
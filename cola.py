@@ -0,0 +1,164 @@
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+import gspread
+from ficheros import escribir_atomico
+
+# --- COLA DE ESCRITURA EN SEGUNDO PLANO ---
+# Los eventos (partidos, goles, porterías a 0) se guardan primero en un diario local
+# y se suben después en lotes con append_rows. Así varias personas pueden registrar
+# eventos a la vez sin esperar a la API ni chocar con la cuota por minuto (429).
+
+class ColaEscritura:
+    """Cola compartida por todas las sesiones del proceso.
+
+    `encolar` escribe el evento en el diario (con fsync) antes de devolver, así que un
+    evento confirmado al usuario no se pierde aunque el proceso se caiga: al arrancar se
+    vuelven a encolar los que no llegaron a subirse. Un hilo sube las filas pendientes de
+    cada pestaña con un solo `append_rows` cuando se llega a `tam_lote` filas o pasan
+    `espera` segundos, con reintentos con espera exponencial si la API falla.
+    """
+
+    def __init__(self, ruta_diario, escribir_filas, tam_lote=20, espera=2.0, espera_maxima=60.0):
+        self.ruta_diario = ruta_diario
+        self.escribir_filas = escribir_filas  # escribir_filas(nombre_hoja, filas)
+        self.tam_lote = tam_lote
+        self.espera = espera
+        self.espera_maxima = espera_maxima
+        self._cond = threading.Condition()
+        self._pendientes = []  # [(id, nombre_hoja, fila)] en orden de llegada
+        self._siguiente_id = 0
+        self._subiendo = False
+        self._pausas = 0  # mientras sea > 0 no empieza ninguna subida (ver `en_pausa`)
+        self.ultimo_error = None
+        self._recuperar_diario()
+        self._hilo = threading.Thread(target=self._bucle, name="cola-escritura", daemon=True)
+        self._hilo.start()
+
+    # --- Diario local ---
+    def _recuperar_diario(self):
+        if not os.path.exists(self.ruta_diario): return
+        eventos, confirmados = {}, set()
+        with open(self.ruta_diario, encoding="utf-8") as f:
+            for linea in f:
+                try: registro = json.loads(linea)
+                except ValueError: continue  # última línea a medio escribir
+                if 'ok' in registro: confirmados.update(registro['ok'])
+                else: eventos[registro['id']] = (registro['hoja'], registro['fila'])
+        for id_evento in sorted(eventos):
+            if id_evento not in confirmados:
+                self._pendientes.append((id_evento, *eventos[id_evento]))
+        self._siguiente_id = max(eventos, default=-1) + 1
+        self._reescribir_diario()
+
+    def _anotar(self, registro):
+        with open(self.ruta_diario, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            f.flush(); os.fsync(f.fileno())
+
+    def _reescribir_diario(self):
+        # Compacta el diario dejando solo los eventos que siguen pendientes
+        escribir_atomico(self.ruta_diario, "".join(
+            json.dumps({'id': id_evento, 'hoja': nombre_hoja, 'fila': fila}, ensure_ascii=False) + "\n"
+            for id_evento, nombre_hoja, fila in self._pendientes))
+
+    # --- API pública ---
+    def encolar(self, nombre_hoja, fila):
+        with self._cond:
+            id_evento = self._siguiente_id
+            self._siguiente_id += 1
+            self._anotar({'id': id_evento, 'hoja': nombre_hoja, 'fila': fila})
+            self._pendientes.append((id_evento, nombre_hoja, fila))
+            if len(self._pendientes) >= self.tam_lote: self._cond.notify_all()
+
+    def pendientes(self, nombre_hoja=None):
+        with self._cond:
+            return [fila for _, hoja, fila in self._pendientes if nombre_hoja is None or hoja == nombre_hoja]
+
+    def vaciar(self, timeout=None):
+        """Fuerza la subida y espera a que no quede nada pendiente. Devuelve False si se agota el tiempo."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._pendientes or self._subiendo:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0: return False
+                self._cond.wait(restante)
+            return True
+
+    @contextmanager
+    def en_pausa(self, timeout=None):
+        """Espera a que acabe la subida en curso y no deja empezar otra hasta salir del bloque.
+        Dentro, lo que hay en la hoja más `pendientes()` son todos los eventos, sin huecos ni
+        repetidos (fuera, un lote puede subirse entre leer la hoja y pedir los pendientes).
+        No se debe llamar a `vaciar` dentro: esperaría a una subida que no puede empezar."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._pausas += 1
+            while self._subiendo:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    self._pausas -= 1
+                    self._cond.notify_all()
+                    raise TimeoutError("La subida en curso a Google Sheets no termina. Inténtalo de nuevo en unos segundos.")
+                self._cond.wait(restante)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._pausas -= 1
+                self._cond.notify_all()
+
+    # --- Hilo de subida ---
+    def _bucle(self):
+        intento = 0
+        while True:
+            with self._cond:
+                if len(self._pendientes) < self.tam_lote or self._pausas:
+                    self._cond.wait(self.espera)
+                if not self._pendientes or self._pausas: continue
+                lote = list(self._pendientes)
+                self._subiendo = True
+            try:
+                self._subir(lote)
+                intento = 0
+            except Exception as e:
+                self.ultimo_error = e
+                with self._cond:
+                    self._subiendo = False
+                    self._cond.notify_all()
+                # Espera exponencial con algo de azar para no reintentar todos a la vez
+                pausa = min(self.espera_maxima, self.espera * (2 ** intento)) * random.uniform(0.5, 1.0)
+                if isinstance(e, gspread.exceptions.APIError) and e.code == 429: pausa = max(pausa, self.espera * 5)
+                intento += 1
+                time.sleep(pausa)
+
+    def _subir(self, lote):
+        # Agrupa por pestaña conservando el orden de llegada dentro de cada una
+        por_hoja = {}
+        for id_evento, nombre_hoja, fila in lote:
+            por_hoja.setdefault(nombre_hoja, []).append((id_evento, fila))
+        for nombre_hoja, eventos in por_hoja.items():
+            self.escribir_filas(nombre_hoja, [fila for _, fila in eventos])
+            subidos = {id_evento for id_evento, _ in eventos}
+            with self._cond:
+                self._anotar({'ok': sorted(subidos)})
+                self._pendientes = [p for p in self._pendientes if p[0] not in subidos]
+        with self._cond:
+            if not self._pendientes: self._reescribir_diario()
+            self._subiendo = False
+            self.ultimo_error = None
+            self._cond.notify_all()
+
+_cola = None
+_lock_cola = threading.Lock()
+
+def obtener_cola(ruta_diario, escribir_filas, **opciones):
+    """Devuelve la cola única del proceso, creándola la primera vez."""
+    global _cola
+    with _lock_cola:
+        if _cola is None: _cola = ColaEscritura(ruta_diario, escribir_filas, **opciones)
+        return _cola
@@ -0,0 +1,54 @@
+import gc
+import hashlib
+import json
+from contextlib import contextmanager
+from entidades import normalizar
+
+# --- COPIA LOCAL PARA ARRANCAR EN FRÍO ---
+# Tras reiniciar el servidor, la primera petición tenía que descargar los tres historiales
+# enteros y recalcular todas las clasificaciones antes de mostrar nada. Ahora la instantánea
+# (historiales, motor de clasificación con sus checkpoints y el cara a cara, contadores e IDs
+# de fila) se guarda en disco cada cierto tiempo. Al arrancar se usa la copia si la marca de
+# modificación del almacén es la misma o si, leídos los historiales, cada uno empieza por lo
+# que hay en la copia (huella de todas sus filas): entonces solo se aplican las filas nuevas.
+# Si se ha borrado o editado algo por fuera se recarga todo (ver Instantanea.arrancar).
+# La copia es JSON con solo listas, números y textos (nada de pickle: cargar un
+# fichero sustituido no puede ejecutar código, y cambiar una clase no rompe las copias).
+
+FORMATO = 3  # Súbelo si cambia lo que se guarda: las copias de otro formato se ignoran
+MAGIA = b"TONOI-COPIA\n"
+
+def huella_filas(registros, encabezados):
+    """SHA-256 de los valores normalizados (da igual número o texto, espacios o mayúsculas)."""
+    h = hashlib.sha256()
+    for registro in registros:
+        h.update("\x1f".join(normalizar(registro.get(c, "")) for c in encabezados).encode("utf-8") + b"\x1e")
+    return h.hexdigest()
+
+@contextmanager
+def sin_recolector():
+    # Crear cientos de miles de tuplas seguidas dispara el recolector de ciclos una y otra
+    # vez sin que haya nada que recoger; al cargar la copia eso era más de la mitad del tiempo
+    activo = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if activo: gc.enable()
+
+def serializar(copia):
+    datos = json.dumps(copia, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    # El SHA-256 solo detecta copias dañadas o a medias
+    return MAGIA + hashlib.sha256(datos).digest() + datos
+
+def cargar(ruta):
+    """La copia guardada en `ruta`, o None si no hay, está dañada o es de otro formato."""
+    try:
+        with open(ruta, "rb") as f: contenido = f.read()
+    except OSError:
+        return None
+    cabecera = len(MAGIA) + hashlib.sha256().digest_size
+    if not contenido.startswith(MAGIA) or hashlib.sha256(contenido[cabecera:]).digest() != contenido[len(MAGIA):cabecera]: return None
+    try: copia = json.loads(contenido[cabecera:])
+    except ValueError: return None
+    return copia if isinstance(copia, dict) and copia.get('formato') == FORMATO else None
@@ -0,0 +1,122 @@
+import threading
+from itertools import repeat
+
+# --- ENTIDADES: NOMBRES CANÓNICOS Y EVENTOS COMPACTOS ---
+# Los nombres de equipos y jugadores se normalizan (mayúsculas y espacios) y se registran
+# una sola vez con un id entero pequeño, así que "Arsenal", "arsenal " y "ARSENAL" son el
+# mismo equipo y se guardan con la grafía con la que apareció primero. Los eventos del
+# historial son tuplas sin __dict__ que comparten esas cadenas en vez de un dict por fila.
+
+def normalizar(nombre):
+    return " ".join(str(nombre).split()).casefold()
+
+class RegistroNombres:
+    """Nombre normalizado -> id (en orden de aparición) e id -> grafía canónica."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}
+        self.nombres = []
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def id_de(self, nombre):
+        """Id del nombre, registrándolo si es nuevo."""
+        clave = normalizar(nombre)
+        i = self._ids.get(clave)
+        if i is None:
+            with self._lock:
+                i = self._ids.get(clave)
+                if i is None:
+                    i = self._ids[clave] = len(self.nombres)
+                    self.nombres.append(" ".join(str(nombre).split()))
+        return i
+
+    def buscar(self, nombre):
+        """Id del nombre, o None si no se ha visto nunca."""
+        return self._ids.get(normalizar(nombre))
+
+    def canonico(self, nombre):
+        # Los vacíos y los que no son texto (números convertidos por numericise) se dejan igual
+        if not isinstance(nombre, str) or not nombre.strip(): return nombre
+        return self.nombres[self.id_de(nombre)]
+
+    def vaciar(self):
+        """Olvida todos los nombres (al borrar todos los datos)."""
+        with self._lock:
+            self._ids = {}
+            self.nombres = []
+
+    def mismo(self, a, b):
+        # None no es ningún nombre (normalizado sería "none")
+        if a is None or b is None: return False
+        return normalizar(a) == normalizar(b)
+
+# Un registro para los equipos y otro para los jugadores (los porteros incluidos)
+equipos = RegistroNombres()
+jugadores = RegistroNombres()
+COLUMNAS_EQUIPO = ("Equipo Ganador", "Equipo Perdedor")
+COLUMNAS_JUGADOR = ("Goleador", "Asistente", "Portero")
+
+class Evento(tuple):
+    """Una fila de historial: tupla inmutable con los valores en el orden de ENCABEZADOS.
+
+    Se lee igual que los dicts de `get_all_records()` (`evento['Goleador']`,
+    `evento.get('Asistente')`, `dict(evento)`), pero ocupa lo que una tupla y los
+    nombres de equipos y jugadores son las cadenas canónicas de los registros."""
+    __slots__ = ()
+    ENCABEZADOS = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._posiciones = {c: i for i, c in enumerate(cls.ENCABEZADOS)}
+        cls._registros = tuple(equipos if c in COLUMNAS_EQUIPO else jugadores if c in COLUMNAS_JUGADOR else None for c in cls.ENCABEZADOS)
+
+    @classmethod
+    def de_valores(cls, valores):
+        valores = list(valores) + [""] * (len(cls.ENCABEZADOS) - len(valores))
+        return tuple.__new__(cls, [r.canonico(v) if r is not None else v for r, v in zip(cls._registros, valores)])
+
+    @classmethod
+    def de_registro(cls, registro):
+        if type(registro) is cls: return registro
+        return cls.de_valores([registro.get(c, "") for c in cls.ENCABEZADOS])
+
+    def get(self, clave, defecto=None):
+        i = self._posiciones.get(clave)
+        return defecto if i is None else tuple.__getitem__(self, i)
+
+    def __getitem__(self, clave):
+        if isinstance(clave, str): return tuple.__getitem__(self, self._posiciones[clave])
+        return tuple.__getitem__(self, clave)
+
+    def __contains__(self, clave):
+        return clave in self._posiciones
+
+    def keys(self):
+        return self.ENCABEZADOS
+
+    def items(self):
+        return zip(self.ENCABEZADOS, tuple.__iter__(self))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+class Partido(Evento):
+    __slots__ = ()
+    ENCABEZADOS = ("Fecha", "Equipo Ganador", "Resultado", "Equipo Perdedor", "ResultadoManual")
+
+class Gol(Evento):
+    __slots__ = ()
+    ENCABEZADOS = ("Fecha", "Goleador", "Asistente")
+
+class PorteriaCero(Evento):
+    __slots__ = ()
+    ENCABEZADOS = ("Fecha", "Portero")
+
+def columna(eventos, clave):
+    """Los valores de `clave` en una lista de eventos del mismo tipo, leídos directamente de
+    la tupla (sin pasar por __getitem__, que es Python y mucho más lento en listas largas)."""
+    if not eventos: return []
+    return list(map(tuple.__getitem__, eventos, repeat(type(eventos[0])._posiciones[clave])))
@@ -0,0 +1,381 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from functools import partial
+import pandas as pd
+import metricas
+import copia_local
+from ficheros import escribir_atomico
+from entidades import Partido, Gol, PorteriaCero, columna, equipos, jugadores
+from collections import Counter
+from motor import MotorClasificacion
+
+# --- ESTADO COMPARTIDO ENTRE SESIONES ---
+# Antes cada sesión (cada pestaña del navegador) cargaba los historiales y recalculaba
+# las clasificaciones en su st.session_state. Ahora hay una única instantánea por proceso;
+# las sesiones solo guardan referencias a ella y el número de versión que han visto.
+
+# Cada historial se guarda como eventos compactos con nombres canónicos (ver entidades.py)
+TIPOS_EVENTO = {"HistorialPartidos": Partido, "HistorialGoles": Gol, "HistorialPorteriasCero": PorteriaCero}
+ENCABEZADOS_PARTIDOS = list(Partido.ENCABEZADOS)
+ENCABEZADOS_HISTORIAL = {nombre: list(tipo.ENCABEZADOS) for nombre, tipo in TIPOS_EVENTO.items()}
+ENCABEZADOS_CLASIFICACION = ["Equipo", "PJ", "V", "E", "D", "P", "PPP", "Partidos con Trofeo", "Mejor Racha", "Intentos", "Destronamientos", "Indice Destronamiento"]
+ENCABEZADOS_GOLEADORES = ["Jugador", "Goles", "Asistencias", "G/A"]
+ENCABEZADOS_PORTEROS = ["Portero", "Porterías a 0"]
+
+class Instantanea:
+    """Historiales y clasificaciones de todo el proceso, con una versión que crece en cada cambio.
+
+    Las escrituras toman `lock`; las lecturas no, porque las clasificaciones se sustituyen
+    por objetos nuevos en cada cambio (los historiales sí se modifican en el sitio, solo
+    añadiendo o quitando filas). `comprobar` detecta, como mucho una vez cada `intervalo`
+    segundos, si el almacén ha cambiado por otra vía (por ejemplo, editando la hoja de
+    cálculo a mano) y en ese caso vuelve a cargar. La primera carga del proceso puede
+    partir de la copia local en disco (ver `arrancar` y copia_local.py).
+
+    Cada fila de historial tiene además un ID estable (crece siempre, también entre
+    recargas), guardado en un array paralelo al historial: permite elegir una fila sin
+    depender de su posición y encontrarla con búsqueda binaria.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.version = 0
+        self.cargada = False
+        self.marca = None
+        self.ultima_comprobacion = 0.0
+        self.motor = MotorClasificacion()
+        self.historial_goles = []
+        self.historial_porterias = []
+        self.clasificacion = {}
+        self.clasificacion_individual = {}
+        self.clasificacion_porteros = {}
+        self.portador_actual = None
+        # Goles, asistencias y porterías a 0 por jugador; se actualizan evento a evento
+        self._goles, self._asistencias, self._porterias = Counter(), Counter(), Counter()
+        self._ids = {nombre: array('q') for nombre in ENCABEZADOS_HISTORIAL}
+        self._siguiente_id = 0
+        self.versiones = dict.fromkeys(ENCABEZADOS_HISTORIAL, 0)  # versión de cada historial
+        self._tablas = {}  # nombre_hoja -> (versión, DataFrame, valores distintos, columnas de esos valores)
+        self._huellas = {}  # nombre_hoja -> (versión, huella del historial entero)
+        self.arranque = None  # cómo se hizo la primera carga: {'modo', 'filas_nuevas', 'motivo'}
+        self.version_copia = None  # versión guardada en la última copia local
+        self.ultima_copia = float('-inf')
+        self._guardando_copia = False
+        self.error_copia = None
+
+    @property
+    def historial(self):
+        return self.motor.historial
+
+    def _nueva_version(self, *nombres_hojas):
+        self.version += 1
+        for nombre_hoja in nombres_hojas or ENCABEZADOS_HISTORIAL: self.versiones[nombre_hoja] += 1
+
+    def _nuevos_ids(self, n):
+        inicio = self._siguiente_id
+        self._siguiente_id += n
+        return range(inicio, inicio + n)
+
+    def _actualizar_clasificacion(self):
+        # Lee la clasificación del motor incremental sin volver a recorrer el historial
+        self.clasificacion = self.motor.resultado()
+        self.portador_actual = next((eq for eq, stats in self.clasificacion.items() if stats.get('Portador')), None)
+
+    def _contar(self, nombre_hoja, eventos, signo=1):
+        # Mismo resultado que calcular_estadisticas_individuales / _porteros, sin recorrer todo el historial
+        if not eventos: return
+        contadores = {'Goleador': self._goles, 'Asistente': self._asistencias} if nombre_hoja == "HistorialGoles" else {'Portero': self._porterias}
+        for clave, contador in contadores.items():
+            nombres = list(filter(None, columna(eventos, clave)))
+            if signo > 0: contador.update(nombres)
+            else:
+                contador.subtract(nombres)
+                for nombre in set(nombres):
+                    if contador[nombre] <= 0: del contador[nombre]
+        self._clasificar(nombre_hoja)
+
+    def _clasificar(self, nombre_hoja):
+        if nombre_hoja == "HistorialGoles":
+            self.clasificacion_individual = {}
+            for jugador in self._goles.keys() | self._asistencias.keys():
+                goles, asistencias = self._goles.get(jugador, 0), self._asistencias.get(jugador, 0)
+                self.clasificacion_individual[jugador] = {'Goles': goles, 'Asistencias': asistencias, 'G/A': goles + asistencias}
+        else:
+            self.clasificacion_porteros = {portero: {'Porterías a 0': n} for portero, n in self._porterias.items()}
+
+    def recargar(self, almacen, nombres_hojas):
+        with self.lock:
+            # La marca se toma antes de leer: si algo cambia mientras tanto, la próxima comprobación lo verá
+            marca = almacen.marca_modificacion()
+            with metricas.etapa("leer_historiales"):
+                historiales = almacen.leer_historiales(nombres_hojas)
+            self._cargar(historiales, marca)
+
+    def _cargar(self, historiales, marca):
+        # Sustituye todo lo que hay en memoria por los registros leídos del almacén con la marca `marca`
+        with self.lock:
+            historiales = {nombre: list(map(TIPOS_EVENTO[nombre].de_registro, registros)) for nombre, registros in historiales.items()}
+            with metricas.etapa("motor_clasificacion"):
+                self.motor = MotorClasificacion(historiales.get("HistorialPartidos", []))
+                self._actualizar_clasificacion()
+            with metricas.etapa("calcular_estadisticas_individuales"):
+                self.historial_goles = historiales.get("HistorialGoles", [])
+                self._goles, self._asistencias, self.clasificacion_individual = Counter(), Counter(), {}
+                self._contar("HistorialGoles", self.historial_goles)
+            with metricas.etapa("calcular_estadisticas_porteros"):
+                self.historial_porterias = historiales.get("HistorialPorteriasCero", [])
+                self._porterias, self.clasificacion_porteros = Counter(), {}
+                self._contar("HistorialPorteriasCero", self.historial_porterias)
+            for nombre_hoja in ENCABEZADOS_HISTORIAL:
+                self._ids[nombre_hoja] = array('q', self._nuevos_ids(len(self._historial_de(nombre_hoja))))
+            self.marca, self.ultima_comprobacion, self.cargada = marca, time.monotonic(), True
+            self._nueva_version()
+
+    def comprobar(self, almacen, nombres_hojas, intervalo=30.0, ruta_copia=None):
+        """Se pone al día si el almacén ha cambiado desde la última carga. Devuelve True si ha cambiado algo.
+
+        La marca de modificación también cambia con las escrituras de la propia app (en Google
+        Sheets, cualquier append o actualización), que ya están en memoria: si el almacén dice
+        que el cambio de marca se debe solo a ellas no se lee nada. Si no, se leen los
+        historiales enteros; si lo que hay en memoria sigue siendo el principio de cada uno
+        (misma huella) solo se añaden las filas nuevas y se conservan los IDs, y si no se
+        carga todo lo leído."""
+        # Cada rerun de cada sesión pasa por aquí: sin el lock mientras no toque comprobar, y sin
+        # esperar si otra sesión está escribiendo (una importación lo tiene mientras sube)
+        if self.cargada:
+            if time.monotonic() - self.ultima_comprobacion < intervalo: return False
+            if not self.lock.acquire(blocking=False): return False
+        else: self.lock.acquire()
+        try:
+            if not self.cargada:
+                self.arrancar(almacen, nombres_hojas, ruta_copia)
+                return True
+            if time.monotonic() - self.ultima_comprobacion < intervalo: return False
+            self.ultima_comprobacion = time.monotonic()
+            marca = almacen.marca_modificacion()
+            if marca == self.marca: return False
+            if almacen.cambio_propio(self.marca, marca):
+                self.marca = marca
+                return False
+            with metricas.etapa("leer_historiales"):
+                historiales = almacen.leer_historiales(nombres_hojas)
+            nuevas, _ = self._filas_añadidas(historiales, {nombre: len(self._historial_de(nombre)) for nombre in historiales},
+                                             {nombre: self.huella(nombre) for nombre in historiales})
+            if nuevas is None:
+                self._cargar(historiales, marca)
+                return True
+            for nombre, registros in nuevas.items():
+                if registros: self.añadir_lote(nombre, registros)
+            self.marca = marca
+            return any(nuevas.values())
+        finally:
+            self.lock.release()
+
+    def huella(self, nombre_hoja):
+        """copia_local.huella_filas del historial entero; se calcula una vez por versión."""
+        version = self.versiones[nombre_hoja]
+        guardada = self._huellas.get(nombre_hoja)
+        if guardada and guardada[0] == version: return guardada[1]
+        huella = copia_local.huella_filas(self._historial_de(nombre_hoja), ENCABEZADOS_HISTORIAL[nombre_hoja])
+        self._huellas[nombre_hoja] = (version, huella)
+        return huella
+
+    def _filas_añadidas(self, historiales, filas, huellas):
+        """Si cada historial leído empieza por `filas[nombre]` registros con huella `huellas[nombre]`
+        (nada se ha borrado ni editado por fuera), ({nombre: los registros que siguen}, None);
+        si no, (None, nombre del primero que ha cambiado)."""
+        nuevas = {}
+        for nombre, registros in historiales.items():
+            n = filas[nombre]
+            if len(registros) < n or copia_local.huella_filas(registros[:n], ENCABEZADOS_HISTORIAL[nombre]) != huellas[nombre]: return None, nombre
+            nuevas[nombre] = registros[n:]
+        return nuevas, None
+
+    # --- Copia local ---
+    def _a_copia(self):
+        # Todo lo necesario para no tener que recorrer los historiales al arrancar
+        historiales = {nombre: self._historial_de(nombre) for nombre in ENCABEZADOS_HISTORIAL}
+        return {
+            'formato': copia_local.FORMATO, 'guardada': time.time(),
+            'historiales': {nombre: list(map(tuple, h)) for nombre, h in historiales.items()},
+            # Para comprobar al arrancar que el almacén sigue igual: la marca de modificación con la
+            # que coincide lo que hay en memoria, y las filas y la huella de cada historial entero
+            'marca': self.marca,
+            'filas': {nombre: len(h) for nombre, h in historiales.items()},
+            'huellas': {nombre: self.huella(nombre) for nombre in historiales},
+            'ids': {nombre: ids.tolist() for nombre, ids in self._ids.items()}, 'siguiente_id': self._siguiente_id,
+            'motor': self.motor.estado_guardado(),
+            # Como pares y no como objeto JSON: un jugador puede llamarse "7" y otro 7
+            'contadores': [list(c.items()) for c in (self._goles, self._asistencias, self._porterias)],
+            'nombres': [equipos.nombres, jugadores.nombres],
+        }
+
+    def _restaurar(self, copia):
+        # Los nombres se registran en el orden original para que conserven su grafía canónica
+        for registro, nombres in zip((equipos, jugadores), copia['nombres']):
+            for nombre in nombres: registro.id_de(nombre)
+        historiales = {nombre: list(map(partial(tuple.__new__, tipo), copia['historiales'][nombre])) for nombre, tipo in TIPOS_EVENTO.items()}
+        self.motor = MotorClasificacion.desde_estado(historiales["HistorialPartidos"], copia['motor'])
+        self._actualizar_clasificacion()
+        self.historial_goles, self.historial_porterias = historiales["HistorialGoles"], historiales["HistorialPorteriasCero"]
+        self._goles, self._asistencias, self._porterias = (Counter(dict(pares)) for pares in copia['contadores'])
+        self._clasificar("HistorialGoles"); self._clasificar("HistorialPorteriasCero")
+        self._ids = {nombre: array('q', ids) for nombre, ids in copia['ids'].items()}
+        self._siguiente_id = max(self._siguiente_id, copia['siguiente_id'])
+
+    def arrancar(self, almacen, nombres_hojas, ruta_copia=None):
+        """Primera carga: desde la copia local si se puede demostrar que el almacén no ha cambiado
+        o que solo se le han añadido filas; si no (o si no hay copia), recarga completa.
+
+        Si el almacén conserva la marca de modificación entre procesos (Google Sheets), no hay
+        nada pendiente de subir y la marca es la de la copia, no se lee nada más. Si no, se leen
+        los historiales enteros: si cada uno empieza por lo que hay en la copia (misma huella de
+        todas sus filas) solo se aplican las filas que siguen, y si no se carga todo lo leído."""
+        with self.lock:
+            copia = None
+            if ruta_copia:
+                with metricas.etapa("cargar_copia_local"), copia_local.sin_recolector(): copia = copia_local.cargar(ruta_copia)
+            if copia is None or not set(nombres_hojas) <= copia['filas'].keys():
+                self.recargar(almacen, nombres_hojas)
+                self.arranque = {'modo': 'completa', 'filas_nuevas': None, 'motivo': 'no hay copia local válida' if ruta_copia else None}
+                return False
+            marca = almacen.marca_modificacion()
+            if almacen.marca_duradera and marca is not None and marca == copia['marca'] and not almacen.pendientes():
+                nuevas = dict.fromkeys(nombres_hojas, [])
+            else:
+                with metricas.etapa("leer_historiales"):
+                    historiales = almacen.leer_historiales(nombres_hojas)
+                nuevas, distinta = self._filas_añadidas(historiales, copia['filas'], copia['huellas'])
+                if nuevas is None:
+                    self._cargar(historiales, marca)
+                    self.arranque = {'modo': 'completa', 'filas_nuevas': None, 'motivo': f'{distinta} ha cambiado desde la copia local'}
+                    return False
+            try:
+                with metricas.etapa("restaurar_copia_local"), copia_local.sin_recolector(): self._restaurar(copia)
+            except (KeyError, TypeError, ValueError) as e:
+                self.recargar(almacen, nombres_hojas)
+                self.arranque = {'modo': 'completa', 'filas_nuevas': None, 'motivo': f'la copia local no se puede usar ({e})'}
+                return False
+            with metricas.etapa("aplicar_filas_nuevas"):
+                for nombre, registros in nuevas.items():
+                    if registros: self.añadir_lote(nombre, registros)
+            self.marca, self.ultima_comprobacion, self.cargada = marca, time.monotonic(), True
+            self._nueva_version()
+            # Si no había nada nuevo y la marca es la misma, la copia en disco ya está al día
+            if not any(nuevas.values()) and marca == copia['marca']: self.version_copia = self.version
+            self.arranque = {'modo': 'copia', 'filas_nuevas': sum(map(len, nuevas.values())), 'motivo': None}
+            return True
+
+    def guardar_copia(self, ruta):
+        with metricas.etapa("guardar_copia_local"):
+            # Se serializa con el lock (el motor y los contadores se modifican en el sitio); se escribe sin él
+            with self.lock, copia_local.sin_recolector():
+                version, contenido = self.version, copia_local.serializar(self._a_copia())
+            escribir_atomico(ruta, contenido)
+        self.version_copia, self.ultima_copia = version, time.monotonic()
+
+    def guardar_copia_si_hace_falta(self, ruta, intervalo=60.0):
+        """Guarda la copia local en otro hilo si ha habido cambios y la última es de hace
+        más de `intervalo` segundos. Devuelve True si ha empezado a guardarla."""
+        if not self.cargada or self._guardando_copia or self.version == self.version_copia: return False
+        if time.monotonic() - self.ultima_copia < intervalo: return False
+        # Si otra sesión está escribiendo no se espera: se guardará en otro rerun
+        if not self.lock.acquire(blocking=False): return False
+        try:
+            if self._guardando_copia: return False
+            self._guardando_copia = True
+        finally:
+            self.lock.release()
+        def guardar():
+            try:
+                self.guardar_copia(ruta)
+                self.error_copia = None
+            except Exception as e:
+                # No se reintenta en cada rerun: se espera al siguiente intervalo
+                self.error_copia, self.ultima_copia = e, time.monotonic()
+            finally:
+                self._guardando_copia = False
+        threading.Thread(target=guardar, name="copia-local", daemon=True).start()
+        return True
+
+    def añadir(self, nombre_hoja, registro):
+        """Añade el evento al final de su historial. Devuelve el evento tal como queda guardado."""
+        return self.añadir_lote(nombre_hoja, [registro])[0]
+
+    def añadir_lote(self, nombre_hoja, registros):
+        """Como `añadir` con muchos registros, pero actualizando las clasificaciones una sola vez."""
+        registros = list(map(TIPOS_EVENTO[nombre_hoja].de_registro, registros))
+        with self.lock:
+            if nombre_hoja == "HistorialPartidos":
+                for registro in registros: self.motor.aplicar(registro)
+                self._actualizar_clasificacion()
+            else:
+                self._historial_de(nombre_hoja).extend(registros)
+                self._contar(nombre_hoja, registros)
+            self._ids[nombre_hoja].extend(self._nuevos_ids(len(registros)))
+            self._nueva_version(nombre_hoja)
+        return registros
+
+    def _historial_de(self, nombre_hoja):
+        return {"HistorialPartidos": self.motor.historial, "HistorialGoles": self.historial_goles}.get(nombre_hoja, self.historial_porterias)
+
+    def contiene(self, nombre_hoja, indice, registro):
+        # Compara por identidad: tras una recarga los registros son objetos nuevos
+        historial = self._historial_de(nombre_hoja)
+        return indice < len(historial) and historial[indice] is registro
+
+    def eliminar(self, nombre_hoja, indice, registro):
+        """Quita el registro `indice`. Devuelve False si en esa posición ya no está `registro`."""
+        with self.lock:
+            if not self.contiene(nombre_hoja, indice, registro): return False
+            if nombre_hoja == "HistorialPartidos":
+                self.motor.eliminar(indice)
+                self._actualizar_clasificacion()
+            else:
+                del self._historial_de(nombre_hoja)[indice]
+                self._contar(nombre_hoja, [registro], signo=-1)
+            del self._ids[nombre_hoja][indice]
+            self._nueva_version(nombre_hoja)
+            return True
+
+    def buscar(self, nombre_hoja, id_fila):
+        """(índice, registro) de la fila con ese ID, o None si ya no existe."""
+        ids = self._ids[nombre_hoja]
+        indice = bisect_left(ids, id_fila)
+        if indice == len(ids) or ids[indice] != id_fila: return None
+        return indice, self._historial_de(nombre_hoja)[indice]
+
+    def tabla(self, nombre_hoja, columnas_valores=()):
+        """DataFrame del historial indexado por ID de fila, con el número de fila ('Nº') y la
+        fecha ya convertida ('_fecha'), y los valores distintos de `columnas_valores` ordenados.
+        Se construye una vez por versión del historial y lo comparten todas las sesiones."""
+        guardada = self._tablas.get(nombre_hoja)
+        if guardada and guardada[0] == self.versiones[nombre_hoja] and guardada[3] == tuple(columnas_valores): return guardada[1], guardada[2]
+        # Sin el lock, como las demás lecturas: se copian el historial y sus IDs y se repite si
+        # mientras tanto ha cambiado la versión (cada cambio la sube al terminar)
+        while True:
+            version = self.versiones[nombre_hoja]
+            registros, ids = list(self._historial_de(nombre_hoja)), self._ids[nombre_hoja][:]
+            if len(registros) == len(ids) and self.versiones[nombre_hoja] == version: break
+        encabezados = ENCABEZADOS_HISTORIAL[nombre_hoja]
+        df = pd.DataFrame.from_records(registros, columns=encabezados, index=pd.Index(ids, name='ID'))
+        df.insert(0, 'Nº', range(1, len(df) + 1))
+        df['_fecha'] = pd.to_datetime(df['Fecha'].astype(str), format="%Y-%m-%d %H:%M:%S", errors='coerce')
+        valores = sorted({v for c in columnas_valores for v in pd.unique(df[c]) if v not in ("", None) and not pd.isna(v)}, key=str)
+        self._tablas[nombre_hoja] = (version, df, valores, tuple(columnas_valores))
+        return df, valores
+
+    def tablas_derivadas(self):
+        """Las tres clasificaciones tal como se guardan en Hoja1, ClasificacionGoleadores y ClasificacionPorteros."""
+        datos_clasif = [ENCABEZADOS_CLASIFICACION] + [[eq, s['T'], s['V'], s['E'], s['D'], s['P'], s['PPM'], s['Partidos con Trofeo'], s['Mejor Racha'], s['Intentos'], s['Destronamientos'], s['Indice Destronamiento']] for eq, s in self.clasificacion.items()]
+        # Ordenados por nombre: el orden de un set cambia al añadir jugadores y generaría diferencias falsas
+        datos_goleadores = [ENCABEZADOS_GOLEADORES] + [[j, s['Goles'], s['Asistencias'], s['G/A']] for j, s in sorted(self.clasificacion_individual.items(), key=lambda x: str(x[0]))]
+        datos_porteros = [ENCABEZADOS_PORTEROS] + [[p, s['Porterías a 0']] for p, s in self.clasificacion_porteros.items()]
+        return {"Hoja1": datos_clasif, "ClasificacionGoleadores": datos_goleadores, "ClasificacionPorteros": datos_porteros}
+
+_instantanea = Instantanea()
+
+def obtener_instantanea():
+    return _instantanea
@@ -0,0 +1,22 @@
+import os
+import threading
+
+# --- ESCRITURA ATÓMICA ---
+# El diario de la cola, el estado de las importaciones, la copia local y el fichero de
+# métricas se sustituyen enteros. Se escribe a un temporal propio de cada hilo, se fuerza a
+# disco y se renombra encima: quien lea (o un arranque tras un corte) ve el fichero anterior
+# o el nuevo, nunca uno a medias.
+
+def escribir_atomico(ruta, contenido):
+    """Sustituye `ruta` por `contenido` (str o bytes; si es texto, en UTF-8)."""
+    temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    modo, codificacion = ("wb", None) if isinstance(contenido, bytes) else ("w", "utf-8")
+    try:
+        with open(temporal, modo, encoding=codificacion) as f:
+            f.write(contenido)
+            f.flush(); os.fsync(f.fileno())
+        os.replace(temporal, ruta)
+    except BaseException:
+        try: os.remove(temporal)
+        except OSError: pass
+        raise
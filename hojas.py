@@ -0,0 +1,222 @@
+import threading
+import time
+import gspread
+from gspread.utils import numericise_all, rowcol_to_a1
+import metricas
+
+# --- CONEXIÓN COMPARTIDA CON GOOGLE SHEETS ---
+# Streamlit vuelve a ejecutar app.py en cada interacción, pero los módulos importados
+# se cargan una sola vez por proceso. Por eso el cliente, el libro y las pestañas viven
+# aquí y se comparten entre todas las sesiones.
+
+_lock = threading.RLock()
+_config = {'creds': None, 'id_hoja': None}
+_cliente = None
+_libro = None
+_hojas = {}
+_ultimas_tablas = {}  # Última versión escrita de cada tabla derivada (Hoja1, etc.)
+_marcas_propias = {}  # marca de modificación antes de una escritura de este proceso -> marca después
+MAX_MARCAS_PROPIAS = 256
+estadisticas = {'aciertos': 0, 'fallos': 0, 'reconexiones': 0}
+
+# Códigos que indican credenciales caducadas o una pestaña/libro que ya no existe
+CODIGOS_RECONEXION = (401, 404)
+
+def configurar(creds, id_hoja):
+    """Fija las credenciales y el libro. Solo invalida la caché si cambian."""
+    creds = dict(creds)
+    with _lock:
+        if _config['creds'] != creds or _config['id_hoja'] != id_hoja:
+            _config['creds'], _config['id_hoja'] = creds, id_hoja
+            _marcas_propias.clear()
+            invalidar()
+
+def invalidar():
+    global _cliente, _libro
+    with _lock:
+        _cliente, _libro = None, None
+        _hojas.clear()
+
+def usar_libro(libro):
+    """Usa un libro ya abierto en vez de conectarse con las credenciales (lo usan los
+    benchmarks con el libro falso de benchmarks/hojas_falsas.py)."""
+    global _libro
+    with _lock:
+        invalidar()
+        _ultimas_tablas.clear()
+        _marcas_propias.clear()
+        _libro = Medido(libro)
+
+def obtener_libro():
+    # El cliente de gspread usa una AuthorizedSession que renueva el token OAuth
+    # por sí sola cuando caduca; solo se recrea si la API devuelve un error de auth.
+    global _cliente, _libro
+    with _lock:
+        if _libro is None:
+            _cliente = gspread.service_account_from_dict(_config['creds'])
+            _libro = Medido(_cliente.open_by_key(_config['id_hoja']))
+        return _libro
+
+def obtener_hoja(nombre_hoja):
+    with _lock:
+        hoja = _hojas.get(nombre_hoja)
+        if hoja is not None:
+            estadisticas['aciertos'] += 1
+            return hoja
+        estadisticas['fallos'] += 1
+        hoja = Medido(obtener_libro().worksheet(nombre_hoja), nombre_hoja)
+        _hojas[nombre_hoja] = hoja
+        return hoja
+
+# --- MEDICIÓN DE LAS PETICIONES ---
+def hoja_de_rango(rango):
+    # "'Hoja 1'!A1:B2" -> "Hoja 1" (inverso de rango_hoja)
+    if not rango.startswith("'"): return rango.partition("!")[0]
+    i = 1
+    while True:
+        i = rango.index("'", i)
+        if rango[i + 1:i + 2] != "'": return rango[1:i].replace("''", "'")
+        i += 2
+
+def _hojas_de_la_llamada(metodo, args, kwargs):
+    if metodo == 'values_batch_get': return [hoja_de_rango(r) for r in (args[0] if args else kwargs.get('ranges', []))]
+    if metodo == 'values_batch_update': return sorted({hoja_de_rango(d['range']) for d in (args[0] if args else kwargs.get('body', {})).get('data', [])})
+    if metodo == 'worksheet': return [args[0] if args else kwargs.get('title', '')]
+    return []
+
+class Medido:
+    """Envoltorio de un libro o una pestaña de gspread que anota en metricas.py cada
+    llamada a la API: cuánto tarda, a qué pestañas afecta y si falla."""
+    def __init__(self, objeto, nombre_hoja=None):
+        self._objeto = objeto
+        self._nombre_hoja = nombre_hoja
+
+    def __getattr__(self, atributo):
+        valor = getattr(self._objeto, atributo)
+        if atributo not in metricas.METODOS_API: return valor
+        def llamada(*args, **kwargs):
+            nombres = [self._nombre_hoja] if self._nombre_hoja else _hojas_de_la_llamada(atributo, args, kwargs)
+            inicio, codigo = time.perf_counter(), None
+            try:
+                return valor(*args, **kwargs)
+            except gspread.exceptions.APIError as e:
+                codigo = e.code
+                raise
+            finally:
+                metricas.registrar_peticion(atributo, nombres, time.perf_counter() - inicio, codigo)
+        return llamada
+
+def debe_reconectar(error):
+    if isinstance(error, gspread.exceptions.WorksheetNotFound): return True
+    return isinstance(error, gspread.exceptions.APIError) and error.code in CODIGOS_RECONEXION
+
+def _con_reconexion(operacion):
+    try:
+        return operacion()
+    except gspread.exceptions.GSpreadException as e:
+        if not debe_reconectar(e): raise
+        with _lock:
+            estadisticas['reconexiones'] += 1
+            invalidar()
+        return operacion()
+
+def ejecutar(nombre_hoja, operacion):
+    """Ejecuta `operacion(hoja)` y, si falla por auth o "no encontrado", reconstruye
+    el cliente y las pestañas y lo intenta una vez más."""
+    return _con_reconexion(lambda: operacion(obtener_hoja(nombre_hoja)))
+
+def ejecutar_en_libro(operacion):
+    """Igual que `ejecutar`, pero para operaciones sobre el libro completo."""
+    return _con_reconexion(lambda: operacion(obtener_libro()))
+
+# --- MARCA DE MODIFICACIÓN ---
+# Drive da la hora de la última modificación del libro con una sola llamada, pero cambia con
+# cualquier escritura, también con las de la app. Cada escritura de este proceso anota la marca
+# de antes y la de después, y así `cambio_propio` distingue esas de las ediciones hechas por fuera.
+
+def marca_modificacion():
+    return ejecutar_en_libro(lambda libro: libro.get_lastUpdateTime())
+
+def escritura_propia(escribir):
+    """Ejecuta `escribir()` y anota el cambio de marca que provoque como propio. Se hace con
+    el lock para que dos escrituras propias a la vez no se mezclen. Si falla no se anota nada."""
+    with _lock:
+        antes = marca_modificacion()
+        resultado = escribir()
+        despues = marca_modificacion()
+        if despues != antes:
+            _marcas_propias[antes] = despues
+            if len(_marcas_propias) > MAX_MARCAS_PROPIAS: del _marcas_propias[next(iter(_marcas_propias))]
+        return resultado
+
+def cambio_propio(desde, hasta):
+    """True si de la marca `desde` a `hasta` solo ha habido escrituras de este proceso."""
+    with _lock:
+        vistas = set()
+        while desde != hasta and desde in _marcas_propias and desde not in vistas:
+            vistas.add(desde)
+            desde = _marcas_propias[desde]
+        return desde == hasta
+
+# --- LECTURA EN LOTE ---
+def rango_hoja(nombre_hoja):
+    return "'" + nombre_hoja.replace("'", "''") + "'"
+
+def a_registros(valores):
+    """Convierte [encabezados, fila, ...] en registros como `get_all_records()`
+    (mismas claves, huecos rellenos con "" y números convertidos) en una sola pasada."""
+    if not valores: return []
+    encabezados = valores[0]
+    ancho = len(encabezados)
+    return [dict(zip(encabezados, numericise_all(fila + [""] * (ancho - len(fila))))) for fila in valores[1:]]
+
+def leer_historiales(nombres_hojas):
+    """Lee varias pestañas con una única petición `values_batch_get`."""
+    respuesta = ejecutar_en_libro(lambda libro: libro.values_batch_get([rango_hoja(n) for n in nombres_hojas]))
+    rangos = respuesta.get('valueRanges', [])
+    return {nombre: a_registros(rango.get('values', [])) for nombre, rango in zip(nombres_hojas, rangos)}
+
+# --- ESCRITURA DE TABLAS DERIVADAS POR DIFERENCIAS ---
+def rangos_cambiados(anterior, nueva):
+    """Compara dos tablas celda a celda y devuelve [(fila, columna, valores)] con los
+    tramos contiguos que han cambiado en cada fila (índices desde 1, como en Sheets).
+    Las celdas que sobran de la versión anterior se vacían con ""."""
+    cambios = []
+    for r in range(max(len(anterior), len(nueva))):
+        fila_ant = anterior[r] if r < len(anterior) else []
+        fila_nueva = nueva[r] if r < len(nueva) else []
+        ancho = max(len(fila_ant), len(fila_nueva))
+        fila_ant = list(fila_ant) + [""] * (ancho - len(fila_ant))
+        fila_nueva = list(fila_nueva) + [""] * (ancho - len(fila_nueva))
+        c = 0
+        while c < ancho:
+            if fila_ant[c] == fila_nueva[c]: c += 1; continue
+            inicio = c
+            while c < ancho and fila_ant[c] != fila_nueva[c]: c += 1
+            cambios.append((r + 1, inicio + 1, fila_nueva[inicio:c]))
+    return cambios
+
+def olvidar_tablas():
+    # Se llama cuando las pestañas se modifican por otra vía (p. ej. al borrar todo)
+    with _lock: _ultimas_tablas.clear()
+
+def escribir_tablas(tablas):
+    """Escribe solo las celdas que han cambiado en todas las tablas con un único
+    `values_batch_update`. Si nada ha cambiado no se hace ninguna petición.
+    Devuelve el número de rangos enviados."""
+    with _lock:
+        desconocidas = [nombre for nombre in tablas if nombre not in _ultimas_tablas]
+        if desconocidas:
+            # La primera vez en el proceso se lee lo que hay para poder comparar
+            respuesta = ejecutar_en_libro(lambda libro: libro.values_batch_get([rango_hoja(n) for n in desconocidas]))
+            for nombre, rango in zip(desconocidas, respuesta.get('valueRanges', [])):
+                _ultimas_tablas[nombre] = [numericise_all(fila) for fila in rango.get('values', [])]
+        datos = []
+        for nombre, nueva in tablas.items():
+            for fila, col, valores in rangos_cambiados(_ultimas_tablas.get(nombre, []), nueva):
+                inicio, fin = rowcol_to_a1(fila, col), rowcol_to_a1(fila, col + len(valores) - 1)
+                datos.append({'range': f"{rango_hoja(nombre)}!{inicio}:{fin}", 'values': [valores]})
+        if datos:
+            escritura_propia(lambda: ejecutar_en_libro(lambda libro: libro.values_batch_update({'valueInputOption': 'RAW', 'data': datos})))
+        for nombre, nueva in tablas.items(): _ultimas_tablas[nombre] = [list(fila) for fila in nueva]
+        return len(datos)
@@ -0,0 +1,201 @@
+import csv
+import hashlib
+import io
+import json
+import os
+from datetime import datetime
+from estado import ENCABEZADOS_HISTORIAL
+from entidades import equipos, jugadores
+from ficheros import escribir_atomico
+
+# --- IMPORTACIÓN EN LOTE ---
+# Para cargar temporadas antiguas desde un CSV o un Excel sin registrar los eventos uno a
+# uno. El fichero se lee fila a fila y se valida entero antes de subir nada (con las mismas
+# reglas que las páginas de añadir, incluida la de que el campeón debe jugar). Después se
+# sube cada pestaña con append_rows en bloques grandes y las clasificaciones se recalculan
+# y se guardan una sola vez al final. Lo ya subido se apunta en un fichero de estado: si la
+# importación se corta, al volver a importar el mismo fichero se sigue desde ahí.
+
+TAM_BLOQUE = 5000  # filas por append_rows
+FILAS_POR_AVISO = 1000  # cada cuántas filas validadas se llama a `progreso`
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+# Columnas que pueden faltar en el fichero (se guardan vacías)
+OPCIONALES = {"ResultadoManual", "Asistente"}
+
+class ErrorImportacion(Exception):
+    pass
+
+def huella(fichero):
+    """SHA-256 del contenido, leído por bloques; deja el fichero al principio."""
+    h = hashlib.sha256()
+    fichero.seek(0)
+    for bloque in iter(lambda: fichero.read(1 << 20), b""): h.update(bloque)
+    fichero.seek(0)
+    return h.hexdigest()
+
+def _normalizar(texto):
+    return str(texto if texto is not None else "").strip().lower()
+
+def _celda(valor):
+    # Excel devuelve fechas como datetime y números como int/float; en el historial van como texto
+    if valor is None: return ""
+    if isinstance(valor, datetime): return valor.strftime(FORMATO_FECHA)
+    if isinstance(valor, float) and valor.is_integer(): return str(int(valor))
+    return str(valor).strip()
+
+def _filas_csv(fichero):
+    texto = io.TextIOWrapper(fichero, encoding="utf-8-sig", newline="")
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try: dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+    except csv.Error: dialecto = csv.excel
+    try:
+        yield from csv.reader(texto, dialecto)
+    finally:
+        texto.detach()  # el fichero lo cierra quien lo abrió
+
+def _filas_excel(fichero, nombre_hoja):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ErrorImportacion("Para importar ficheros Excel hace falta instalar openpyxl (pip install openpyxl).")
+    libro = openpyxl.load_workbook(fichero, read_only=True, data_only=True)
+    try:
+        # Si el libro tiene una pestaña con el nombre del historial se usa esa; si no, la primera
+        hoja = libro[nombre_hoja] if nombre_hoja in libro.sheetnames else libro.worksheets[0]
+        for fila in hoja.iter_rows(values_only=True): yield [_celda(v) for v in fila]
+    finally:
+        libro.close()
+
+def leer_filas(fichero, nombre_fichero, nombre_hoja):
+    """Genera (número de línea, fila como lista en el orden de ENCABEZADOS_HISTORIAL) sin
+    cargar el fichero entero. La primera fila del fichero son los encabezados (da igual
+    el orden, las mayúsculas y los espacios)."""
+    encabezados = ENCABEZADOS_HISTORIAL[nombre_hoja]
+    filas = _filas_excel(fichero, nombre_hoja) if nombre_fichero.lower().endswith((".xlsx", ".xlsm")) else _filas_csv(fichero)
+    cabecera = next(filas, None)
+    if cabecera is None: raise ErrorImportacion("El fichero está vacío.")
+    posiciones = {_normalizar(c): i for i, c in enumerate(cabecera)}
+    faltan = [c for c in encabezados if _normalizar(c) not in posiciones and c not in OPCIONALES]
+    if faltan: raise ErrorImportacion(f"Faltan columnas: {', '.join(faltan)}. Se esperan: {', '.join(encabezados)}.")
+    indices = [posiciones.get(_normalizar(c)) for c in encabezados]
+    for linea, fila in enumerate(filas, start=2):
+        valores = [_celda(fila[i]) if i is not None and i < len(fila) else "" for i in indices]
+        if any(valores): yield linea, valores  # las filas vacías se saltan
+
+def _fecha_valida(texto):
+    # Se admite también solo el día; se guarda con hora para que ordene igual que las de la app
+    for formato in (FORMATO_FECHA, "%Y-%m-%d"):
+        try: return datetime.strptime(texto, formato).strftime(FORMATO_FECHA)
+        except ValueError: pass
+    return None
+
+def validar(nombre_hoja, filas, portador=None, hay_partidos=False, ultima_fecha="", saltar=0, progreso=None):
+    """Valida las filas de `leer_filas`. Devuelve (filas válidas, errores por línea).
+
+    En los partidos se sigue la cadena del trofeo desde `portador` (el campeón actual): en
+    cada partido tiene que jugar el campeón, un empate lo "gana" el campeón y una victoria
+    del aspirante le da el trofeo. Además, como los partidos se añaden al final del
+    historial, tienen que ir en orden de fecha y no ser anteriores a `ultima_fecha`.
+    Las `saltar` primeras filas ya se subieron en una importación anterior y solo se cuentan.
+    Los nombres se comparan sin registrarlos: las filas válidas quedan como están en el
+    fichero y `canonizar` les pone la grafía canónica si no ha habido errores."""
+    validas, errores = [], []
+    for n, (linea, fila) in enumerate(filas, start=1):
+        if progreso and n % FILAS_POR_AVISO == 0: progreso("Validando", n, None)
+        if saltar:
+            saltar -= 1
+            continue
+        fecha = _fecha_valida(fila[0])
+        if fecha is None:
+            errores.append(f"Línea {linea}: fecha '{fila[0]}' no válida (se espera AAAA-MM-DD HH:MM:SS)."); continue
+        fila[0] = fecha
+        if nombre_hoja == "HistorialPartidos":
+            _, ganador, resultado, perdedor, _ = fila
+            if not ganador or not perdedor or equipos.mismo(ganador, perdedor):
+                errores.append(f"Línea {linea}: hacen falta dos equipos válidos y diferentes."); continue
+            if resultado not in ("Victoria", "Empate"):
+                errores.append(f"Línea {linea}: el resultado debe ser 'Victoria' o 'Empate', no '{resultado}'."); continue
+            if fecha < ultima_fecha:
+                errores.append(f"Línea {linea}: el partido ({fecha}) es anterior al último del historial ({ultima_fecha})."); continue
+            if portador and not (equipos.mismo(portador, ganador) or equipos.mismo(portador, perdedor)):
+                errores.append(f"Línea {linea}: el campeón ({portador}) debe jugar."); continue
+            if resultado == "Empate" and portador and not equipos.mismo(ganador, portador):
+                errores.append(f"Línea {linea}: en un empate el 'Equipo Ganador' debe ser el campeón ({portador})."); continue
+            if not hay_partidos or resultado == "Victoria": portador = ganador
+            hay_partidos, ultima_fecha = True, fecha
+        elif not fila[1]:
+            errores.append(f"Línea {linea}: el {'goleador' if nombre_hoja == 'HistorialGoles' else 'portero'} es obligatorio."); continue
+        validas.append(fila)
+    return validas, errores
+
+def canonizar(nombre_hoja, filas):
+    # Los nombres se suben con su grafía canónica, como desde las páginas de añadir. Solo se
+    # hace con un fichero ya validado entero: así una errata de un fichero rechazado no se
+    # queda registrada como la grafía de un equipo o un jugador
+    for fila in filas:
+        if nombre_hoja == "HistorialPartidos": fila[1], fila[3] = equipos.canonico(fila[1]), equipos.canonico(fila[3])
+        else: fila[1:] = map(jugadores.canonico, fila[1:])
+    return filas
+
+# --- Estado de las importaciones a medias ---
+def _leer_estado(ruta):
+    if not os.path.exists(ruta): return {}
+    with open(ruta, encoding="utf-8") as f:
+        try: return json.load(f)
+        except ValueError: return {}
+
+def _guardar_estado(ruta, estado_importaciones):
+    escribir_atomico(ruta, json.dumps(estado_importaciones))
+
+def olvidar_importaciones(ruta):
+    # Al borrar todos los datos: si no, al volver a importar un fichero que se cortó se
+    # saltarían las filas que se subieron antes del borrado
+    try: os.remove(ruta)
+    except FileNotFoundError: pass
+
+def _estado_historial(instantanea):
+    # (campeón, si hay partidos, fecha del último): contra lo que se validan los partidos
+    with instantanea.lock:
+        historial = instantanea.historial
+        return instantanea.portador_actual, bool(historial), str(historial[-1].get('Fecha', '')) if historial else ""
+
+def importar(almacen, instantanea, nombre_hoja, fichero, nombre_fichero, ruta_estado, progreso=None, tam_bloque=TAM_BLOQUE):
+    """Valida e importa un fichero en `nombre_hoja`. `progreso(fase, hechas, total)` se llama
+    durante la validación y tras cada bloque subido. Devuelve {'importadas', 'reanudada_desde', 'errores'};
+    si hay errores no se sube nada. No guarda las clasificaciones: eso lo hace quien llama, una vez."""
+    progreso = progreso or (lambda fase, hechas, total: None)
+    clave = f"{nombre_hoja}:{huella(fichero)}"
+    estado_importaciones = _leer_estado(ruta_estado)
+    ya_subidas = estado_importaciones.get(clave, {}).get('subidas', 0)
+
+    # Se valida sin el lock de la instantánea (con un fichero grande tarda, y las demás sesiones
+    # seguirían sin poder escribir) contra el campeón y la última fecha de ahora...
+    progreso("Validando", 0, None)
+    estado_validado = _estado_historial(instantanea)
+    portador, hay_partidos, ultima_fecha = estado_validado
+    validas, errores = validar(nombre_hoja, leer_filas(fichero, nombre_fichero, nombre_hoja), portador=portador, hay_partidos=hay_partidos,
+                               ultima_fecha=ultima_fecha, saltar=ya_subidas, progreso=progreso)
+    if errores: return {'importadas': 0, 'reanudada_desde': ya_subidas, 'errores': errores}
+
+    # ...y con el lock, como guardar_evento_historial, se comprueba que siguen igual y se sube:
+    # otra sesión no puede registrar nada en medio y el orden de las filas en memoria es el
+    # mismo que en el almacén
+    with instantanea.lock:
+        if nombre_hoja == "HistorialPartidos" and _estado_historial(instantanea) != estado_validado:
+            raise ErrorImportacion("Se han registrado o eliminado partidos mientras se validaba el fichero. Vuelve a importarlo.")
+        canonizar(nombre_hoja, validas)
+
+        total = ya_subidas + len(validas)
+        encabezados = ENCABEZADOS_HISTORIAL[nombre_hoja]
+        for inicio in range(0, len(validas), tam_bloque):
+            bloque = validas[inicio:inicio + tam_bloque]
+            almacen.añadir_eventos(nombre_hoja, bloque)
+            estado_importaciones[clave] = {'subidas': ya_subidas + inicio + len(bloque), 'total': total}
+            _guardar_estado(ruta_estado, estado_importaciones)
+            progreso("Subiendo", ya_subidas + inicio + len(bloque), total)
+        # Las clasificaciones se recalculan una sola vez con todas las filas nuevas
+        instantanea.añadir_lote(nombre_hoja, [dict(zip(encabezados, fila)) for fila in validas])
+        estado_importaciones.pop(clave, None)
+        _guardar_estado(ruta_estado, estado_importaciones)
+        return {'importadas': len(validas), 'reanudada_desde': ya_subidas, 'errores': []}
@@ -0,0 +1,147 @@
+import json
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from ficheros import escribir_atomico
+
+# --- MÉTRICAS DEL PROCESO ---
+# Cuánto tarda cada etapa de un rerun y cuántas peticiones se hacen a la API de Google,
+# por pestaña y por minuto. Como la conexión de hojas.py, son del proceso y las comparten
+# todas las sesiones. La página "Rendimiento" las muestra y se pueden exportar en JSON o
+# en el formato de texto de Prometheus.
+
+# Cuota por defecto de la API de Sheets para un usuario (la cuenta de servicio), por minuto
+CUOTA_POR_MINUTO = {'lectura': 60, 'escritura': 60}
+METODOS_LECTURA = ('values_batch_get', 'worksheet', 'row_values', 'get_all_records', 'get_all_values')
+METODOS_ESCRITURA = ('values_batch_update', 'append_rows', 'delete_rows', 'clear', 'update')
+# get_lastUpdateTime va a la API de Drive, que tiene su propia cuota
+METODOS_DRIVE = ('get_lastUpdateTime',)
+METODOS_API = METODOS_LECTURA + METODOS_ESCRITURA + METODOS_DRIVE
+MUESTRAS_POR_ETAPA = 500  # p50/p95 sobre las últimas N duraciones de cada etapa
+VENTANA_PETICIONES = 3600  # segundos de peticiones que se guardan para el desglose por minuto
+
+_lock = threading.Lock()
+_duraciones = {}  # etapa -> deque[segundos]
+_totales = {}  # etapa -> [número, suma de segundos]
+_peticiones = Counter()  # (hoja, método) -> número
+_errores = Counter()  # (método, código) -> número
+_recientes = deque()  # (instante, tipo) de cada petición de la última VENTANA_PETICIONES
+_desde = time.time()
+
+def tipo_de(metodo):
+    if metodo in METODOS_ESCRITURA: return 'escritura'
+    if metodo in METODOS_DRIVE: return 'drive'
+    return 'lectura'
+
+def registrar(nombre_etapa, segundos):
+    with _lock:
+        if nombre_etapa not in _duraciones:
+            _duraciones[nombre_etapa] = deque(maxlen=MUESTRAS_POR_ETAPA)
+            _totales[nombre_etapa] = [0, 0.0]
+        _duraciones[nombre_etapa].append(segundos)
+        _totales[nombre_etapa][0] += 1
+        _totales[nombre_etapa][1] += segundos
+
+@contextmanager
+def etapa(nombre_etapa):
+    """Cronometra el bloque (o la función, usado como decorador). También cuenta si
+    termina con una excepción, como la que lanza st.rerun()."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(nombre_etapa, time.perf_counter() - inicio)
+
+def registrar_peticion(metodo, nombres_hojas, segundos, codigo_error=None):
+    """Una petición a la API que afecta a `nombres_hojas` (una petición en lote cuenta para
+    cada pestaña que incluye, pero una sola vez para la cuota)."""
+    ahora = time.time()
+    registrar(f"api.{metodo}", segundos)
+    with _lock:
+        for nombre_hoja in nombres_hojas or ['(libro)']: _peticiones[(nombre_hoja, metodo)] += 1
+        if codigo_error is not None: _errores[(metodo, codigo_error)] += 1
+        _recientes.append((ahora, tipo_de(metodo)))
+        while _recientes and _recientes[0][0] < ahora - VENTANA_PETICIONES: _recientes.popleft()
+
+def reiniciar():
+    global _desde
+    with _lock:
+        _duraciones.clear(); _totales.clear(); _peticiones.clear(); _errores.clear(); _recientes.clear()
+        _desde = time.time()
+
+def percentil(valores, p):
+    # Interpolación lineal entre los dos valores más cercanos (como numpy.percentile)
+    if not valores: return 0.0
+    ordenados = sorted(valores)
+    posicion = (len(ordenados) - 1) * p / 100
+    i = int(posicion)
+    if i + 1 >= len(ordenados): return ordenados[-1]
+    return ordenados[i] + (ordenados[i + 1] - ordenados[i]) * (posicion - i)
+
+def peticiones_por_minuto(minutos=10):
+    """[(minuto "HH:MM", {tipo: número})] de los últimos `minutos` minutos, el actual incluido."""
+    ahora = time.time()
+    actual = int(ahora // 60)
+    cubos = {m: Counter() for m in range(actual - minutos + 1, actual + 1)}
+    with _lock:
+        for instante, tipo in _recientes:
+            m = int(instante // 60)
+            if m in cubos: cubos[m][tipo] += 1
+    return [(time.strftime("%H:%M", time.localtime(m * 60)), dict(c)) for m, c in sorted(cubos.items())]
+
+def resumen():
+    """Todas las métricas como un dict que se puede pasar a JSON."""
+    ahora = time.time()
+    with _lock:
+        etapas = {}
+        for nombre_etapa, duraciones in _duraciones.items():
+            muestras = list(duraciones)
+            etapas[nombre_etapa] = {
+                'n': _totales[nombre_etapa][0], 'suma_s': _totales[nombre_etapa][1],
+                'p50_s': percentil(muestras, 50), 'p95_s': percentil(muestras, 95),
+                'max_s': max(muestras), 'ultimo_s': muestras[-1],
+            }
+        ultimo_minuto = Counter(tipo for instante, tipo in _recientes if instante >= ahora - 60)
+        por_hoja = {}
+        for (nombre_hoja, metodo), n in _peticiones.items(): por_hoja.setdefault(nombre_hoja, {})[metodo] = n
+        errores = [{'metodo': m, 'codigo': c, 'n': n} for (m, c), n in _errores.items()]
+    return {
+        'desde': _desde, 'etapas': etapas, 'peticiones_por_hoja': por_hoja, 'errores': errores,
+        'ultimo_minuto': {tipo: ultimo_minuto.get(tipo, 0) for tipo in ('lectura', 'escritura', 'drive')},
+        'cuota_restante': {tipo: cuota - ultimo_minuto.get(tipo, 0) for tipo, cuota in CUOTA_POR_MINUTO.items()},
+    }
+
+def a_json():
+    return json.dumps(resumen(), ensure_ascii=False, indent=2)
+
+def _etiquetas(**etiquetas):
+    escapar = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in etiquetas.items()) + "}"
+
+def a_prometheus():
+    """Las métricas en el formato de texto de Prometheus (para el textfile collector, por ejemplo)."""
+    datos = resumen()
+    lineas = ["# HELP tonoi_etapa_segundos Duración de cada etapa (cuantiles sobre las últimas muestras).", "# TYPE tonoi_etapa_segundos summary"]
+    for nombre_etapa, e in sorted(datos['etapas'].items()):
+        lineas.append(f"tonoi_etapa_segundos{_etiquetas(etapa=nombre_etapa, quantile='0.5')} {e['p50_s']:.6f}")
+        lineas.append(f"tonoi_etapa_segundos{_etiquetas(etapa=nombre_etapa, quantile='0.95')} {e['p95_s']:.6f}")
+        lineas.append(f"tonoi_etapa_segundos_sum{_etiquetas(etapa=nombre_etapa)} {e['suma_s']:.6f}")
+        lineas.append(f"tonoi_etapa_segundos_count{_etiquetas(etapa=nombre_etapa)} {e['n']}")
+    lineas += ["# HELP tonoi_api_peticiones_total Peticiones a la API de Google por pestaña y método.", "# TYPE tonoi_api_peticiones_total counter"]
+    for nombre_hoja, metodos in sorted(datos['peticiones_por_hoja'].items()):
+        for metodo, n in sorted(metodos.items()):
+            lineas.append(f"tonoi_api_peticiones_total{_etiquetas(hoja=nombre_hoja, metodo=metodo)} {n}")
+    lineas += ["# HELP tonoi_api_errores_total Peticiones fallidas por método y código HTTP.", "# TYPE tonoi_api_errores_total counter"]
+    for e in datos['errores']:
+        lineas.append(f"tonoi_api_errores_total{_etiquetas(metodo=e['metodo'], codigo=e['codigo'])} {e['n']}")
+    lineas += ["# HELP tonoi_api_peticiones_ultimo_minuto Peticiones en los últimos 60 segundos.", "# TYPE tonoi_api_peticiones_ultimo_minuto gauge"]
+    for tipo, n in datos['ultimo_minuto'].items():
+        lineas.append(f"tonoi_api_peticiones_ultimo_minuto{_etiquetas(tipo=tipo)} {n}")
+    lineas += ["# HELP tonoi_api_cuota_restante Peticiones que quedan de la cuota por minuto.", "# TYPE tonoi_api_cuota_restante gauge"]
+    for tipo, n in datos['cuota_restante'].items():
+        lineas.append(f"tonoi_api_cuota_restante{_etiquetas(tipo=tipo)} {n}")
+    return "\n".join(lineas) + "\n"
+
+def escribir_prometheus(ruta):
+    escribir_atomico(ruta, a_prometheus())
@@ -0,0 +1,317 @@
+from collections import Counter
+from bisect import bisect_right
+from itertools import islice
+from array import array
+
+# --- MOTORES DE CÁLCULO ---
+# Este módulo no depende de Streamlit para que el estado pueda vivir fuera
+# de cada rerun del script (y para poder usarlo desde otros scripts).
+
+def calcular_todas_las_estadisticas(historial):
+    # (Esta función no necesita cambios, ya que lee 'Resultado' para la lógica del campeón)
+    if not historial: return {}
+    clasificacion = {}
+    rachas_actuales = {}
+    portador_trofeo = None
+    def asegurar_equipo(equipo):
+        if equipo and equipo not in clasificacion:
+            clasificacion[equipo] = {'V': 0, 'E': 0, 'D': 0, 'T': 0, 'P': 0, 'PPM': 0.0, 'Mejor Racha': 0, 'Destronamientos': 0, 'Intentos': 0, 'Indice Destronamiento': 0.0, 'Partidos con Trofeo': 0}
+            rachas_actuales[equipo] = 0
+    for i, partido in enumerate(historial):
+        ganador, perdedor, resultado = partido.get('Equipo Ganador'), partido.get('Equipo Perdedor'), partido.get('Resultado')
+        if not all([ganador, perdedor, resultado]): continue
+        asegurar_equipo(ganador); asegurar_equipo(perdedor)
+        if resultado == "Empate": clasificacion[ganador]['E'] += 1
+        else: clasificacion[ganador]['V'] += 1
+        clasificacion[perdedor]['D'] += 1
+        rachas_actuales[ganador] += 1
+        if rachas_actuales[ganador] > clasificacion[ganador]['Mejor Racha']: clasificacion[ganador]['Mejor Racha'] = rachas_actuales[ganador]
+        rachas_actuales[perdedor] = 0
+        if i == 0: portador_trofeo = ganador
+        else:
+            portador_en_partido = portador_trofeo
+            if ganador == portador_en_partido or perdedor == portador_en_partido:
+                aspirante = ganador if perdedor == portador_en_partido else perdedor
+                clasificacion[aspirante]['Intentos'] += 1
+                if resultado == "Victoria" and ganador == aspirante:
+                    clasificacion[aspirante]['Destronamientos'] += 1
+                    portador_trofeo = aspirante
+        if portador_trofeo: clasificacion[portador_trofeo]['Partidos con Trofeo'] += 1
+    for equipo, stats in clasificacion.items():
+        stats['T'] = stats['V'] + stats['E'] + stats['D']
+        stats['P'] = (stats['V'] * 2) + (stats['E'] * 1)
+        stats['PPM'] = (stats['P'] / stats['T']) if stats['T'] > 0 else 0.0
+        if stats['Intentos'] > 0: stats['Indice Destronamiento'] = (stats['Destronamientos'] / stats['Intentos']) * 100
+    if portador_trofeo and portador_trofeo in clasificacion: clasificacion[portador_trofeo]['Portador'] = True
+    return clasificacion
+
+def calcular_estadisticas_individuales(historial_goles):
+    if not historial_goles: return {}
+    goleadores = Counter(evento['Goleador'] for evento in historial_goles if evento.get('Goleador'))
+    asistentes = Counter(evento['Asistente'] for evento in historial_goles if evento.get('Asistente'))
+    jugadores = set(goleadores.keys()) | set(asistentes.keys())
+    clasificacion_individual = {}
+    for jugador in jugadores:
+        goles = goleadores.get(jugador, 0)
+        asistencias = asistentes.get(jugador, 0)
+        clasificacion_individual[jugador] = {'Goles': goles, 'Asistencias': asistencias, 'G/A': goles + asistencias}
+    return clasificacion_individual
+
+def calcular_estadisticas_porteros(historial_porterias):
+    if not historial_porterias: return {}
+    porteros = Counter(evento['Portero'] for evento in historial_porterias if evento.get('Portero'))
+    return {portero: {'Porterías a 0': count} for portero, count in porteros.items()}
+
+# --- MOTOR INCREMENTAL DE CLASIFICACIÓN ---
+# Contadores que se acumulan partido a partido. T, P, PPM e Indice se derivan al final.
+CONTADORES = ('V', 'E', 'D', 'Mejor Racha', 'Destronamientos', 'Intentos', 'Partidos con Trofeo')
+
+class IndiceCaraACara:
+    """Victorias, empates y retos por el título de cada pareja de equipos.
+
+    Cada equipo recibe un id entero en orden de aparición y los contadores viven en matrices
+    planas (`array`) de lado `capacidad`, que se dobla cuando no caben más equipos:
+    `victorias[a * capacidad + b]` son las victorias de a sobre b, `empates` es simétrica,
+    `retos[a * capacidad + b]` las veces que a jugó por el título contra b siendo b el portador
+    y `destronamientos` las que además se lo quitó. El reto de cada partido aplicado se guarda
+    en tres arrays paralelos para poder deshacerlo cuando se elimina un partido anterior.
+    """
+    MATRICES = ('victorias', 'empates', 'retos', 'destronamientos')
+
+    def __init__(self, capacidad=16):
+        self.ids = {}
+        self.equipos = []
+        self.capacidad = capacidad
+        for nombre in self.MATRICES: setattr(self, nombre, array('l', [0]) * (capacidad * capacidad))
+        # Por partido: id del aspirante y del portador (-1 si no hubo reto) y si ganó el título
+        self.reto_aspirante, self.reto_portador, self.reto_ganado = array('l'), array('l'), array('b')
+
+    def _id(self, equipo):
+        i = self.ids.get(equipo)
+        if i is None:
+            i = self.ids[equipo] = len(self.equipos)
+            self.equipos.append(equipo)
+            if i >= self.capacidad: self._crecer()
+        return i
+
+    def _crecer(self):
+        antigua, nueva = self.capacidad, self.capacidad * 2
+        for nombre in self.MATRICES:
+            vieja, matriz = getattr(self, nombre), array('l', [0]) * (nueva * nueva)
+            for a in range(antigua): matriz[a * nueva:a * nueva + antigua] = vieja[a * antigua:(a + 1) * antigua]
+            setattr(self, nombre, matriz)
+        self.capacidad = nueva
+
+    def sumar_partido(self, ganador, perdedor, empate, signo=1):
+        """Suma (o resta, con `signo=-1`) un resultado a la pareja. O(1)."""
+        g, p, n = self._id(ganador), self._id(perdedor), self.capacidad
+        if empate:
+            self.empates[g * n + p] += signo
+            self.empates[p * n + g] += signo
+        else: self.victorias[g * n + p] += signo
+
+    def anotar_reto(self, aspirante=None, portador=None, ganado=False):
+        """Guarda el reto del siguiente partido (o que no lo hubo, sin argumentos)."""
+        if aspirante is None:
+            self.reto_aspirante.append(-1); self.reto_portador.append(-1); self.reto_ganado.append(0)
+            return
+        a, p = self._id(aspirante), self._id(portador)
+        self.retos[a * self.capacidad + p] += 1
+        if ganado: self.destronamientos[a * self.capacidad + p] += 1
+        self.reto_aspirante.append(a); self.reto_portador.append(p); self.reto_ganado.append(int(ganado))
+
+    def deshacer_retos_desde(self, n):
+        """Quita los retos de los partidos a partir del `n`-ésimo (se vuelven a anotar al reaplicarlos)."""
+        c = self.capacidad
+        for a, p, ganado in zip(self.reto_aspirante[n:], self.reto_portador[n:], self.reto_ganado[n:]):
+            if a < 0: continue
+            self.retos[a * c + p] -= 1
+            if ganado: self.destronamientos[a * c + p] -= 1
+        del self.reto_aspirante[n:], self.reto_portador[n:], self.reto_ganado[n:]
+
+    def estado_guardado(self):
+        return {
+            'equipos': list(self.equipos), 'capacidad': self.capacidad,
+            **{nombre: getattr(self, nombre).tolist() for nombre in self.MATRICES + ('reto_aspirante', 'reto_portador', 'reto_ganado')},
+        }
+
+    @classmethod
+    def desde_estado(cls, guardado):
+        indice = cls.__new__(cls)
+        indice.equipos = list(guardado['equipos'])
+        indice.ids = {eq: i for i, eq in enumerate(indice.equipos)}
+        indice.capacidad = guardado['capacidad']
+        for nombre in cls.MATRICES + ('reto_aspirante', 'reto_portador'): setattr(indice, nombre, array('l', guardado[nombre]))
+        indice.reto_ganado = array('b', guardado['reto_ganado'])
+        if any(len(getattr(indice, nombre)) != indice.capacidad ** 2 for nombre in cls.MATRICES): raise ValueError("Matrices de tamaño incorrecto")
+        return indice
+
+    def enfrentamiento(self, equipo_a, equipo_b):
+        """Balance de `equipo_a` contra `equipo_b`, sin recorrer el historial."""
+        a, b, n = self.ids.get(equipo_a), self.ids.get(equipo_b), self.capacidad
+        if a is None or b is None: return dict.fromkeys(('V', 'E', 'D', 'Retos', 'Retos Recibidos', 'Destronamientos', 'Destronado'), 0)
+        return {
+            'V': self.victorias[a * n + b], 'E': self.empates[a * n + b], 'D': self.victorias[b * n + a],
+            'Retos': self.retos[a * n + b], 'Retos Recibidos': self.retos[b * n + a],
+            'Destronamientos': self.destronamientos[a * n + b], 'Destronado': self.destronamientos[b * n + a],
+        }
+
+    def matriz(self, nombre='victorias'):
+        """(equipos, filas) de una de las MATRICES, solo con los equipos que tienen algún partido."""
+        n, m = self.capacidad, getattr(self, nombre)
+        v, e = self.victorias, self.empates
+        activos = [i for i in range(len(self.equipos)) if any(v[i * n + j] or v[j * n + i] or e[i * n + j] for j in range(len(self.equipos)))]
+        return [self.equipos[i] for i in activos], [[m[i * n + j] for j in activos] for i in activos]
+
+class MotorClasificacion:
+    """Aplica los partidos de uno en uno en vez de recalcular todo el historial.
+
+    `resultado()` devuelve exactamente lo mismo que `calcular_todas_las_estadisticas`
+    sobre los partidos aplicados. Cada `INTERVALO_CHECKPOINT` partidos se guarda una
+    copia compacta del estado (tuplas de contadores), de modo que al eliminar un partido
+    solo se vuelve a aplicar lo que hay desde el checkpoint anterior al índice eliminado,
+    y `motor_en(n)` reconstruye la clasificación tras cualquier partido aplicando como
+    mucho `INTERVALO_CHECKPOINT - 1` partidos. `cara_a_cara` (IndiceCaraACara) se mantiene a
+    la vez: al eliminar, los resultados solo se restan para la pareja afectada.
+    """
+    INTERVALO_CHECKPOINT = 256
+
+    def __init__(self, historial=None):
+        self.historial = []
+        self.reiniciar()
+        if historial: self.cargar(historial)
+
+    def reiniciar(self):
+        self.clasificacion = {}
+        self.rachas_actuales = {}
+        self.portador_trofeo = None
+        self.n_partidos = 0
+        self.cara_a_cara = IndiceCaraACara()
+        # checkpoints[k] es el estado tras aplicar k * INTERVALO_CHECKPOINT partidos
+        self.checkpoints = [self._copiar_estado()]
+
+    def _copiar_estado(self):
+        return ({eq: tuple(s.values()) for eq, s in self.clasificacion.items()}, dict(self.rachas_actuales), self.portador_trofeo)
+
+    def _restaurar_estado(self, estado):
+        clasificacion, rachas, portador = estado
+        self.clasificacion = {eq: dict(zip(CONTADORES, s)) for eq, s in clasificacion.items()}
+        self.rachas_actuales = dict(rachas)
+        self.portador_trofeo = portador
+
+    def estado_guardado(self):
+        """Todo el estado salvo el historial solo con listas, números y textos (para la copia local,
+        ver copia_local.py). Los diccionarios van como pares porque las claves pueden ser números."""
+        return {
+            'contadores': list(CONTADORES),
+            'clasificacion': [[eq, list(s.values())] for eq, s in self.clasificacion.items()],
+            'rachas_actuales': list(self.rachas_actuales.items()),
+            'portador_trofeo': self.portador_trofeo,
+            'n_partidos': self.n_partidos,
+            'checkpoints': [[list(c.items()), list(r.items()), p] for c, r, p in self.checkpoints],
+            'cara_a_cara': self.cara_a_cara.estado_guardado(),
+        }
+
+    @classmethod
+    def desde_estado(cls, historial, guardado):
+        # Sin volver a aplicar los partidos: el estado ya corresponde a `historial`
+        if guardado['contadores'] != list(CONTADORES): raise ValueError("La copia tiene otros contadores")
+        motor = cls()
+        motor.historial = historial
+        motor._restaurar_estado(({eq: s for eq, s in guardado['clasificacion']}, guardado['rachas_actuales'], guardado['portador_trofeo']))
+        motor.n_partidos = guardado['n_partidos']
+        motor.checkpoints = [({eq: tuple(s) for eq, s in c}, dict(r), p) for c, r, p in guardado['checkpoints']]
+        motor.cara_a_cara = IndiceCaraACara.desde_estado(guardado['cara_a_cara'])
+        return motor
+
+    def cargar(self, historial):
+        self.historial = list(historial)
+        self.reiniciar()
+        for partido in self.historial: self._aplicar(partido)
+
+    def aplicar(self, partido):
+        """Añade un partido al final del historial y actualiza la clasificación."""
+        self.historial.append(partido)
+        self._aplicar(partido)
+
+    def _aplicar(self, partido, sumar_resultado=True):
+        i = self.n_partidos
+        self.n_partidos += 1
+        h2h, reto = self.cara_a_cara, ()
+        ganador, perdedor, resultado = partido.get('Equipo Ganador'), partido.get('Equipo Perdedor'), partido.get('Resultado')
+        if all([ganador, perdedor, resultado]):
+            if h2h is not None and sumar_resultado: h2h.sumar_partido(ganador, perdedor, resultado == "Empate")
+            clasif = self.clasificacion
+            for equipo in (ganador, perdedor):
+                if equipo not in clasif:
+                    clasif[equipo] = dict.fromkeys(CONTADORES, 0)
+                    self.rachas_actuales[equipo] = 0
+            if resultado == "Empate": clasif[ganador]['E'] += 1
+            else: clasif[ganador]['V'] += 1
+            clasif[perdedor]['D'] += 1
+            self.rachas_actuales[ganador] += 1
+            if self.rachas_actuales[ganador] > clasif[ganador]['Mejor Racha']: clasif[ganador]['Mejor Racha'] = self.rachas_actuales[ganador]
+            self.rachas_actuales[perdedor] = 0
+            if i == 0: self.portador_trofeo = ganador
+            else:
+                portador = self.portador_trofeo
+                if ganador == portador or perdedor == portador:
+                    aspirante = ganador if perdedor == portador else perdedor
+                    clasif[aspirante]['Intentos'] += 1
+                    reto = (aspirante, portador, False)
+                    if resultado == "Victoria" and ganador == aspirante:
+                        clasif[aspirante]['Destronamientos'] += 1
+                        self.portador_trofeo = aspirante
+                        reto = (aspirante, portador, True)
+            if self.portador_trofeo: clasif[self.portador_trofeo]['Partidos con Trofeo'] += 1
+        if h2h is not None: h2h.anotar_reto(*reto)
+        if self.n_partidos % self.INTERVALO_CHECKPOINT == 0:
+            self.checkpoints.append(self._copiar_estado())
+
+    def eliminar(self, indice):
+        """Quita el partido `indice` y rehace solo desde el checkpoint anterior."""
+        eliminado = self.historial.pop(indice)
+        k = min(indice // self.INTERVALO_CHECKPOINT, len(self.checkpoints) - 1)
+        del self.checkpoints[k + 1:]
+        self._restaurar_estado(self.checkpoints[k])
+        self.n_partidos = k * self.INTERVALO_CHECKPOINT
+        # Los resultados cara a cara de los demás partidos no cambian; los retos sí (depende de quién era el portador)
+        ganador, perdedor, resultado = eliminado.get('Equipo Ganador'), eliminado.get('Equipo Perdedor'), eliminado.get('Resultado')
+        if all([ganador, perdedor, resultado]): self.cara_a_cara.sumar_partido(ganador, perdedor, resultado == "Empate", signo=-1)
+        self.cara_a_cara.deshacer_retos_desde(self.n_partidos)
+        for partido in self.historial[self.n_partidos:]: self._aplicar(partido, sumar_resultado=False)
+
+    def motor_en(self, n):
+        """Motor en el estado que tenía tras los `n` primeros partidos (sin modificar este).
+
+        Sirve para consultar la clasificación, el portador y las rachas en cualquier punto
+        del historial: se parte del checkpoint anterior y se aplican los partidos que faltan."""
+        n = max(0, min(n, self.n_partidos))
+        k = min(n // self.INTERVALO_CHECKPOINT, len(self.checkpoints) - 1)
+        pasado = MotorClasificacion()
+        pasado.cara_a_cara = None  # el cara a cara solo se consulta sobre el historial completo
+        pasado._restaurar_estado(self.checkpoints[k])
+        pasado.n_partidos = k * self.INTERVALO_CHECKPOINT
+        for partido in islice(self.historial, pasado.n_partidos, n): pasado._aplicar(partido)
+        return pasado
+
+    def partidos_hasta(self, fecha):
+        """Número de partidos jugados hasta `fecha` inclusive ("%Y-%m-%d %H:%M:%S"), por búsqueda binaria.
+        Supone que el historial está en orden cronológico, como cuando se registra desde la app."""
+        return bisect_right(self.historial, fecha, key=lambda partido: str(partido.get('Fecha', '')))
+
+    def resultado(self):
+        if not self.n_partidos: return {}
+        clasificacion = {}
+        for equipo, c in self.clasificacion.items():
+            T = c['V'] + c['E'] + c['D']
+            P = (c['V'] * 2) + (c['E'] * 1)
+            clasificacion[equipo] = {
+                'V': c['V'], 'E': c['E'], 'D': c['D'], 'T': T, 'P': P,
+                'PPM': (P / T) if T > 0 else 0.0,
+                'Mejor Racha': c['Mejor Racha'], 'Destronamientos': c['Destronamientos'], 'Intentos': c['Intentos'],
+                'Indice Destronamiento': (c['Destronamientos'] / c['Intentos']) * 100 if c['Intentos'] > 0 else 0.0,
+                'Partidos con Trofeo': c['Partidos con Trofeo'],
+            }
+        if self.portador_trofeo and self.portador_trofeo in clasificacion: clasificacion[self.portador_trofeo]['Portador'] = True
+        return clasificacion
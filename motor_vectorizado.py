@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+from entidades import Evento, columna
+
+# --- MOTOR VECTORIZADO (pandas / NumPy) ---
+# Misma lógica que los motores de motor.py, pero cargando cada historial una sola vez
+# como DataFrame tipado (equipos y jugadores como categorías) y contando con operaciones
+# agrupadas. Solo la línea del trofeo (quién lo tiene tras cada partido) se recorre
+# reinado a reinado, en un bucle corto sobre enteros. Es para recalcular de una vez
+# historiales grandes desde scripts (los benchmarks lo comparan con motor.py); la app no lo
+# usa, porque la instantánea necesita el estado partido a partido del motor incremental
+# (checkpoints, cara a cara) y con él cada evento cuesta menos que cualquier recálculo.
+
+COLUMNAS_CLASIFICACION = ['V', 'E', 'D', 'T', 'P', 'PPM', 'Mejor Racha', 'Destronamientos', 'Intentos', 'Indice Destronamiento', 'Partidos con Trofeo']
+
+def _columna(registros, clave):
+    # Igual que `evento.get(clave)` + prueba de verdad: faltante, None y "" cuentan como vacíos
+    if registros and isinstance(registros[0], Evento): return pd.Series(columna(registros, clave), dtype=object)
+    return pd.Series([r.get(clave) for r in registros], dtype=object)
+
+def _es_verdadero(serie):
+    # Se evalúa bool() una vez por valor distinto, no por fila; los faltantes (código -1) van al último hueco
+    codigos, valores = pd.factorize(serie.to_numpy())
+    return np.array([bool(v) for v in valores] + [False], dtype=bool)[codigos]
+
+def cargar_partidos(historial):
+    """DataFrame de partidos válidos con los equipos como categorías (en orden de aparición).
+    La columna `indice` es la posición original en el historial (importa para el primer partido).
+    Acepta los registros de siempre o un DataFrame con las columnas de HistorialPartidos."""
+    if isinstance(historial, pd.DataFrame):
+        ganador, perdedor, resultado = (historial[c].astype(object).reset_index(drop=True) if c in historial else pd.Series([None] * len(historial), dtype=object) for c in ('Equipo Ganador', 'Equipo Perdedor', 'Resultado'))
+    else:
+        ganador, perdedor, resultado = _columna(historial, 'Equipo Ganador'), _columna(historial, 'Equipo Perdedor'), _columna(historial, 'Resultado')
+    valido = _es_verdadero(ganador) & _es_verdadero(perdedor) & _es_verdadero(resultado)
+    resultado = resultado[valido].to_numpy()
+    # Un solo factorize sobre ganador y perdedor intercalados da los códigos de ambos y las
+    # categorías en el orden en que aparece cada equipo, como las claves del dict original
+    intercalados = np.empty(2 * int(valido.sum()), dtype=object)
+    intercalados[0::2], intercalados[1::2] = ganador[valido].to_numpy(), perdedor[valido].to_numpy()
+    codigos, equipos = pd.factorize(intercalados)
+    return pd.DataFrame({
+        'indice': np.flatnonzero(valido),
+        'ganador': pd.Categorical.from_codes(codigos[0::2], categories=equipos),
+        'perdedor': pd.Categorical.from_codes(codigos[1::2], categories=equipos),
+        'empate': resultado == "Empate",
+        'victoria': resultado == "Victoria",
+    })
+
+def _mejores_rachas(g, p, n_equipos):
+    # Cada partido suma 1 a la racha del ganador (también en empate) y pone a 0 la del perdedor.
+    # Se ordenan los eventos por equipo (estable, así conservan el orden temporal) y se cortan en
+    # tramos en cada reinicio; la mejor racha es el tramo con más partidos sumados.
+    # Con el tipo entero más pequeño posible, argsort estable usa radix sort
+    equipo = np.empty(2 * len(g), dtype=np.min_scalar_type(n_equipos))
+    equipo[0::2], equipo[1::2] = g, p
+    suma = np.zeros(2 * len(g), dtype=np.int64)
+    suma[0::2] = 1
+    orden = np.argsort(equipo, kind='stable')
+    equipo, suma = equipo[orden], suma[orden]
+    nuevo_tramo = (suma == 0)
+    nuevo_tramo[0] = True
+    nuevo_tramo[1:] |= equipo[1:] != equipo[:-1]
+    tramo = np.cumsum(nuevo_tramo) - 1
+    largo = np.bincount(tramo, weights=suma).astype(np.int64)
+    mejores = np.zeros(n_equipos, dtype=np.int64)
+    np.maximum.at(mejores, equipo[np.flatnonzero(nuevo_tramo)], largo)
+    return mejores
+
+def _linea_del_trofeo(indice, g, p, victoria, n_equipos):
+    # El portador solo cambia cuando pierde un partido con resultado "Victoria" (el ganador es
+    # entonces el aspirante). El bucle secuencial recorre reinados, no partidos: para cada
+    # portador se busca con searchsorted su siguiente derrota; el resto se cuenta vectorizado.
+    n = len(g)
+    if not n or indice[0] != 0:
+        # Si el primer partido del historial no es válido nunca hay portador (igual que en motor.py)
+        cero = np.zeros(n_equipos, dtype=np.int64)
+        return cero, cero.copy(), cero.copy(), -1
+    derrotas = np.flatnonzero(victoria)
+    derrotas = derrotas[np.argsort(p[derrotas].astype(np.min_scalar_type(n_equipos)), kind='stable')]
+    cortes = np.searchsorted(p[derrotas], np.arange(n_equipos + 1))
+    derrotas_de = [derrotas[cortes[e]:cortes[e + 1]] for e in range(n_equipos)]
+    inicios, portadores = [], []
+    pos, portador = 1, int(g[0])
+    while pos < n:
+        inicios.append(pos); portadores.append(portador)
+        propias = derrotas_de[portador]
+        k = np.searchsorted(propias, pos)
+        if k == len(propias): break
+        # El reinado acaba en esa derrota; el ganador la empieza en el partido siguiente
+        fin = int(propias[k])
+        portador, pos = int(g[fin]), fin + 1
+    # Portador antes de cada partido (el del partido 0 es el suyo propio)
+    antes = np.repeat(np.array(portadores, dtype=np.int64), np.diff(np.append(np.array(inicios, dtype=np.int64), n)))
+    antes = np.concatenate(([g[0]], antes)).astype(np.int64)
+    implicado = (g == antes) | (p == antes)
+    implicado[0] = False
+    aspirante = np.where(p == antes, g, p)
+    gana = implicado & victoria & (g == aspirante)
+    despues = np.where(gana, aspirante, antes)
+    intentos = np.bincount(aspirante[implicado], minlength=n_equipos)
+    destronamientos = np.bincount(aspirante[gana], minlength=n_equipos)
+    return intentos, destronamientos, np.bincount(despues, minlength=n_equipos), int(despues[-1])
+
+def clasificacion_vectorizada(historial):
+    """Lo mismo que `calcular_todas_las_estadisticas`, como DataFrame indexado por equipo
+    con una columna booleana 'Portador'. `historial` puede ser ya el resultado de `cargar_partidos`."""
+    partidos = historial if isinstance(historial, pd.DataFrame) and 'indice' in historial else cargar_partidos(historial)
+    equipos = partidos['ganador'].cat.categories
+    n = len(equipos)
+    if not n: return pd.DataFrame(columns=COLUMNAS_CLASIFICACION + ['Portador'])
+    g, p = partidos['ganador'].cat.codes.to_numpy(), partidos['perdedor'].cat.codes.to_numpy()
+    empate = partidos['empate'].to_numpy()
+    df = pd.DataFrame(index=pd.Index(equipos, name='Equipo'))
+    df['V'] = np.bincount(g[~empate], minlength=n)
+    df['E'] = np.bincount(g[empate], minlength=n)
+    df['D'] = np.bincount(p, minlength=n)
+    df['T'] = df['V'] + df['E'] + df['D']
+    df['P'] = df['V'] * 2 + df['E']
+    df['PPM'] = (df['P'] / df['T']).astype(float)
+    df['Mejor Racha'] = _mejores_rachas(g, p, n)
+    intentos, destronamientos, con_trofeo, portador = _linea_del_trofeo(partidos['indice'].to_numpy(), g, p, partidos['victoria'].to_numpy(), n)
+    df['Destronamientos'] = destronamientos
+    df['Intentos'] = intentos
+    df['Indice Destronamiento'] = np.where(intentos > 0, destronamientos / np.maximum(intentos, 1) * 100, 0.0)
+    df['Partidos con Trofeo'] = con_trofeo
+    df['Portador'] = np.arange(n) == portador
+    return df
+
+def _contar(serie):
+    # value_counts con factorize + bincount, descartando después los valores vacíos ("", None)
+    codigos, valores = pd.factorize(serie.to_numpy())
+    cuentas = pd.Series(np.bincount(codigos[codigos >= 0], minlength=len(valores)), index=pd.Index(valores, dtype=object), dtype=np.int64)
+    return cuentas[[bool(v) for v in valores]]
+
+def goleadores_vectorizado(historial_goles):
+    """Goles, asistencias y G/A por jugador, ordenado por G/A como en la página de clasificación."""
+    goles, asistencias = _contar(_columna(historial_goles, 'Goleador')), _contar(_columna(historial_goles, 'Asistente'))
+    df = pd.concat({'Goles': goles, 'Asistencias': asistencias}, axis=1).fillna(0).astype(np.int64)
+    df['G/A'] = df['Goles'] + df['Asistencias']
+    return df.sort_values(by="G/A", ascending=False)
+
+def porteros_vectorizado(historial_porterias):
+    df = _contar(_columna(historial_porterias, 'Portero')).rename('Porterías a 0').to_frame()
+    return df.sort_values(by="Porterías a 0", ascending=False)
@@ -0,0 +1,181 @@
+import csv
+import io
+import pytest
+import almacenamiento
+import estado
+import importacion
+from entidades import equipos
+from motor import calcular_todas_las_estadisticas
+
+# Las reglas de la importación de partidos (cadena del trofeo, campeón en los empates, orden
+# de fechas) y la reanudación de una importación cortada a medias
+
+HOJAS = list(estado.ENCABEZADOS_HISTORIAL)
+
+def partido(fecha, ganador, perdedor, resultado="Victoria"):
+    return [fecha, ganador, resultado, perdedor, ""]
+
+def validar_partidos(partidos, **opciones):
+    filas = [(linea, list(p)) for linea, p in enumerate(partidos, start=2)]
+    return importacion.validar("HistorialPartidos", filas, **opciones)
+
+def a_csv(partidos):
+    texto = io.StringIO()
+    csv.writer(texto).writerows([estado.ENCABEZADOS_HISTORIAL["HistorialPartidos"]] + partidos)
+    return io.BytesIO(texto.getvalue().encode("utf-8"))
+
+def temporada(n):
+    # El campeón gana siempre: la cadena del trofeo es válida para cualquier n
+    rivales = ["Chelsea", "Spurs", "Everton", "Leeds"]
+    return [partido(f"2020-01-{1 + i // 24:02d} {i % 24:02d}:00:00", "Arsenal", rivales[i % len(rivales)]) for i in range(n)]
+
+# --- Cadena del trofeo ---
+def test_el_primer_partido_da_el_trofeo_y_el_campeon_debe_jugar():
+    validas, errores = validar_partidos([
+        partido("2020-01-01 10:00:00", "Arsenal", "Chelsea"),
+        partido("2020-01-02 10:00:00", "Spurs", "Everton"),
+    ])
+    assert len(validas) == 1
+    assert errores == ["Línea 3: el campeón (Arsenal) debe jugar."]
+
+def test_una_victoria_del_aspirante_le_da_el_trofeo():
+    validas, errores = validar_partidos([
+        partido("2020-01-01 10:00:00", "Arsenal", "Chelsea"),
+        partido("2020-01-02 10:00:00", "Spurs", "Arsenal"),
+        partido("2020-01-03 10:00:00", "Spurs", "Leeds"),
+        partido("2020-01-04 10:00:00", "Arsenal", "Chelsea"),
+    ])
+    assert len(validas) == 3
+    assert errores == ["Línea 5: el campeón (Spurs) debe jugar."]
+
+def test_la_cadena_parte_del_campeon_actual():
+    _, errores = validar_partidos([partido("2020-01-01 10:00:00", "Arsenal", "Chelsea")], portador="Spurs", hay_partidos=True)
+    assert errores == ["Línea 2: el campeón (Spurs) debe jugar."]
+    _, errores = validar_partidos([partido("2020-01-01 10:00:00", "arsenal ", "Chelsea")], portador="Arsenal", hay_partidos=True)
+    assert errores == []
+
+# --- Empates ---
+def test_en_un_empate_el_ganador_debe_ser_el_campeon():
+    validas, errores = validar_partidos([
+        partido("2020-01-01 10:00:00", "Arsenal", "Chelsea"),
+        partido("2020-01-02 10:00:00", "Chelsea", "Arsenal", "Empate"),
+        partido("2020-01-03 10:00:00", "Arsenal", "Chelsea", "Empate"),
+        partido("2020-01-04 10:00:00", "Arsenal", "Spurs"),
+    ])
+    assert len(validas) == 3
+    assert errores == ["Línea 3: en un empate el 'Equipo Ganador' debe ser el campeón (Arsenal)."]
+
+def test_un_primer_partido_empatado_da_el_trofeo_al_equipo_ganador():
+    _, errores = validar_partidos([
+        partido("2020-01-01 10:00:00", "Arsenal", "Chelsea", "Empate"),
+        partido("2020-01-02 10:00:00", "Spurs", "Everton"),
+    ])
+    assert errores == ["Línea 3: el campeón (Arsenal) debe jugar."]
+
+def test_resultado_y_equipos_no_validos():
+    _, errores = validar_partidos([
+        partido("2020-01-01 10:00:00", "Arsenal", "Chelsea", "Derrota"),
+        partido("2020-01-01 10:00:00", "Arsenal", " ARSENAL"),
+        partido("2020-01-01 10:00:00", "", "Chelsea"),
+    ])
+    assert errores == [
+        "Línea 2: el resultado debe ser 'Victoria' o 'Empate', no 'Derrota'.",
+        "Línea 3: hacen falta dos equipos válidos y diferentes.",
+        "Línea 4: hacen falta dos equipos válidos y diferentes.",
+    ]
+
+# --- Orden de fechas ---
+def test_los_partidos_van_en_orden_de_fecha():
+    validas, errores = validar_partidos([
+        partido("2020-01-02 10:00:00", "Arsenal", "Chelsea"),
+        partido("2020-01-01 10:00:00", "Arsenal", "Spurs"),
+        partido("2020-01-02", "Arsenal", "Leeds"),
+    ])
+    assert [v[0] for v in validas] == ["2020-01-02 10:00:00"]
+    assert errores == [
+        "Línea 3: el partido (2020-01-01 10:00:00) es anterior al último del historial (2020-01-02 10:00:00).",
+        "Línea 4: el partido (2020-01-02 00:00:00) es anterior al último del historial (2020-01-02 10:00:00).",
+    ]
+
+def test_no_se_importa_nada_anterior_al_historial():
+    _, errores = validar_partidos([partido("2020-01-01 10:00:00", "Arsenal", "Chelsea")],
+                                  portador="Arsenal", hay_partidos=True, ultima_fecha="2021-01-01 00:00:00")
+    assert errores == ["Línea 2: el partido (2020-01-01 10:00:00) es anterior al último del historial (2021-01-01 00:00:00)."]
+
+def test_fecha_no_valida():
+    _, errores = validar_partidos([partido("01/02/2020", "Arsenal", "Chelsea")])
+    assert errores == ["Línea 2: fecha '01/02/2020' no válida (se espera AAAA-MM-DD HH:MM:SS)."]
+
+def test_un_fichero_rechazado_no_registra_nombres():
+    _, errores = validar_partidos([
+        partido("2020-01-01 10:00:00", "Equipo Con Errata", "Chelsea"),
+        partido("2020-01-01 10:00:00", "Otro", "Chelsea", "Derrota"),
+    ])
+    assert errores
+    assert equipos.buscar("Equipo Con Errata") is None
+
+# --- Reanudación ---
+@pytest.fixture
+def almacen(tmp_path):
+    return almacenamiento.AlmacenSQLite(str(tmp_path / "tonoi.sqlite3"), estado.ENCABEZADOS_HISTORIAL)
+
+def test_reanuda_tras_un_corte_sin_repetir_ni_saltar_filas(almacen, tmp_path, monkeypatch):
+    ruta_estado = str(tmp_path / "importaciones.json")
+    partidos = temporada(250)
+    instantanea = estado.Instantanea()
+    instantanea.recargar(almacen, HOJAS)
+
+    subir = almacen.añadir_eventos
+    bloques = []
+    def cortar_en_el_tercer_bloque(nombre_hoja, filas):
+        bloques.append(len(filas))
+        if len(bloques) == 3: raise RuntimeError("corte")
+        subir(nombre_hoja, filas)
+    monkeypatch.setattr(almacen, "añadir_eventos", cortar_en_el_tercer_bloque)
+    with pytest.raises(RuntimeError):
+        importacion.importar(almacen, instantanea, "HistorialPartidos", a_csv(partidos), "partidos.csv", ruta_estado, tam_bloque=100)
+    monkeypatch.setattr(almacen, "añadir_eventos", subir)
+
+    # Como hace la app tras un error: se recarga para ver lo que sí se subió
+    instantanea.recargar(almacen, HOJAS)
+    assert len(instantanea.historial) == 200
+    resultado = importacion.importar(almacen, instantanea, "HistorialPartidos", a_csv(partidos), "partidos.csv", ruta_estado, tam_bloque=100)
+    assert resultado == {'importadas': 50, 'reanudada_desde': 200, 'errores': []}
+
+    guardados = almacen.leer_historiales(["HistorialPartidos"])["HistorialPartidos"]
+    assert [[r[c] for c in estado.ENCABEZADOS_HISTORIAL["HistorialPartidos"]] for r in guardados] == partidos
+    assert instantanea.clasificacion == calcular_todas_las_estadisticas(guardados)
+
+def test_tras_borrar_todo_se_importa_desde_el_principio(almacen, tmp_path, monkeypatch):
+    ruta_estado = str(tmp_path / "importaciones.json")
+    partidos = temporada(30)
+    instantanea = estado.Instantanea()
+    instantanea.recargar(almacen, HOJAS)
+    subir = almacen.añadir_eventos
+    def cortar_en_el_segundo_bloque(nombre_hoja, filas):
+        if almacen.leer_historiales(["HistorialPartidos"])["HistorialPartidos"]: raise RuntimeError("corte")
+        subir(nombre_hoja, filas)
+    monkeypatch.setattr(almacen, "añadir_eventos", cortar_en_el_segundo_bloque)
+    with pytest.raises(RuntimeError):
+        importacion.importar(almacen, instantanea, "HistorialPartidos", a_csv(partidos), "partidos.csv", ruta_estado, tam_bloque=10)
+    monkeypatch.setattr(almacen, "añadir_eventos", subir)
+
+    almacen.reiniciar({nombre: estado.ENCABEZADOS_HISTORIAL[nombre] for nombre in HOJAS})
+    importacion.olvidar_importaciones(ruta_estado)
+    instantanea.recargar(almacen, HOJAS)
+    resultado = importacion.importar(almacen, instantanea, "HistorialPartidos", a_csv(partidos), "partidos.csv", ruta_estado, tam_bloque=10)
+    assert resultado == {'importadas': 30, 'reanudada_desde': 0, 'errores': []}
+    assert len(almacen.leer_historiales(["HistorialPartidos"])["HistorialPartidos"]) == 30
+
+def test_rechaza_si_cambia_el_historial_mientras_se_valida(almacen, tmp_path, monkeypatch):
+    instantanea = estado.Instantanea()
+    instantanea.recargar(almacen, HOJAS)
+    validar = importacion.validar
+    def validar_y_registrar_otro_partido(*args, **opciones):
+        resultado = validar(*args, **opciones)
+        instantanea.añadir("HistorialPartidos", dict(zip(estado.ENCABEZADOS_HISTORIAL["HistorialPartidos"], partido("2030-01-01 10:00:00", "Fulham", "Leeds"))))
+        return resultado
+    monkeypatch.setattr(importacion, "validar", validar_y_registrar_otro_partido)
+    with pytest.raises(importacion.ErrorImportacion):
+        importacion.importar(almacen, instantanea, "HistorialPartidos", a_csv(temporada(5)), "partidos.csv", str(tmp_path / "importaciones.json"))
+    assert almacen.leer_historiales(["HistorialPartidos"])["HistorialPartidos"] == []
@@ -0,0 +1,83 @@
+import random
+import pytest
+from motor import MotorClasificacion, calcular_todas_las_estadisticas
+
+# El motor incremental tiene que dar exactamente lo mismo que recalcular todo el historial
+# (mismos valores y mismo orden de equipos y de claves), también tras eliminar partidos
+# de cualquier posición y al reconstruir la clasificación en un punto del pasado.
+
+EQUIPOS = ["Arsenal", "Chelsea", "Spurs", "Everton", "Leeds", "Fulham"]
+
+class MotorPequeño(MotorClasificacion):
+    # Con checkpoints muy seguidos se prueban los bordes entre tramos con historiales cortos
+    INTERVALO_CHECKPOINT = 4
+
+def partido_aleatorio(azar):
+    ganador, perdedor = azar.sample(EQUIPOS, 2)
+    partido = {'Fecha': "2024-01-01 00:00:00", 'Equipo Ganador': ganador, 'Resultado': azar.choice(["Victoria", "Victoria", "Empate"]), 'Equipo Perdedor': perdedor, 'ResultadoManual': ""}
+    if azar.random() < 0.1:
+        # Filas incompletas, como las que deja una edición a mano de la hoja
+        partido[azar.choice(['Equipo Ganador', 'Equipo Perdedor', 'Resultado'])] = azar.choice(["", None])
+    return partido
+
+def comprobar_igual(motor, historial):
+    esperado = calcular_todas_las_estadisticas(historial)
+    obtenido = motor.resultado()
+    assert obtenido == esperado
+    assert list(obtenido) == list(esperado)
+    for equipo in esperado: assert list(obtenido[equipo]) == list(esperado[equipo])
+
+def cara_a_cara_por_fuerza_bruta(historial):
+    resultados, retos = {}, {}
+    portador = None
+    for i, partido in enumerate(historial):
+        ganador, perdedor, resultado = partido.get('Equipo Ganador'), partido.get('Equipo Perdedor'), partido.get('Resultado')
+        if not all([ganador, perdedor, resultado]): continue
+        if resultado == "Empate":
+            resultados[(ganador, perdedor, 'E')] = resultados.get((ganador, perdedor, 'E'), 0) + 1
+            resultados[(perdedor, ganador, 'E')] = resultados.get((perdedor, ganador, 'E'), 0) + 1
+        else: resultados[(ganador, perdedor, 'V')] = resultados.get((ganador, perdedor, 'V'), 0) + 1
+        if i == 0: portador = ganador
+        elif portador in (ganador, perdedor):
+            aspirante = ganador if perdedor == portador else perdedor
+            retos[(aspirante, portador, 'Retos')] = retos.get((aspirante, portador, 'Retos'), 0) + 1
+            if resultado == "Victoria" and ganador == aspirante:
+                retos[(aspirante, portador, 'Destronamientos')] = retos.get((aspirante, portador, 'Destronamientos'), 0) + 1
+                portador = aspirante
+    def balance(a, b):
+        return {'V': resultados.get((a, b, 'V'), 0), 'E': resultados.get((a, b, 'E'), 0), 'D': resultados.get((b, a, 'V'), 0),
+                'Retos': retos.get((a, b, 'Retos'), 0), 'Retos Recibidos': retos.get((b, a, 'Retos'), 0),
+                'Destronamientos': retos.get((a, b, 'Destronamientos'), 0), 'Destronado': retos.get((b, a, 'Destronamientos'), 0)}
+    return balance
+
+@pytest.mark.parametrize("semilla", range(300))
+def test_aplicar_y_eliminar_igual_que_recalcular(semilla):
+    azar = random.Random(semilla)
+    historial = [partido_aleatorio(azar) for _ in range(azar.randint(0, 30))]
+    motor = MotorPequeño()
+    motor.cargar(historial)
+    comprobar_igual(motor, historial)
+    for _ in range(20):
+        if historial and azar.random() < 0.4:
+            indice = azar.randrange(len(historial))
+            motor.eliminar(indice)
+            del historial[indice]
+        else:
+            partido = partido_aleatorio(azar)
+            motor.aplicar(partido)
+            historial.append(partido)
+        comprobar_igual(motor, historial)
+    balance = cara_a_cara_por_fuerza_bruta(historial)
+    for a in EQUIPOS:
+        for b in EQUIPOS:
+            if a != b: assert motor.cara_a_cara.enfrentamiento(a, b) == balance(a, b)
+
+@pytest.mark.parametrize("semilla", range(50))
+def test_motor_en_igual_que_recalcular_el_prefijo(semilla):
+    azar = random.Random(semilla)
+    historial = [partido_aleatorio(azar) for _ in range(azar.randint(1, 40))]
+    motor = MotorPequeño(historial)
+    for n in range(len(historial) + 1):
+        comprobar_igual(motor.motor_en(n), historial[:n])
+    # Consultar el pasado no modifica el motor
+    comprobar_igual(motor, historial)
@@ -0,0 +1,50 @@
+import random
+import pytest
+from entidades import Partido, Gol, PorteriaCero
+from motor import calcular_todas_las_estadisticas, calcular_estadisticas_individuales, calcular_estadisticas_porteros
+from motor_vectorizado import clasificacion_vectorizada, goleadores_vectorizado, porteros_vectorizado
+
+# El motor vectorizado tiene que dar lo mismo que las funciones de motor.py, con los
+# registros de siempre (dicts) y con los eventos compactos de entidades.py
+
+EQUIPOS = ["Arsenal", "Chelsea", "Spurs", "Everton", "Leeds"]
+JUGADORES = ["Saka", "Palmer", "Son", "Rice", "Kane", "Pickford"]
+
+def historial_aleatorio(azar, n):
+    partidos = []
+    for _ in range(n):
+        ganador, perdedor = azar.sample(EQUIPOS, 2)
+        partido = {'Fecha': "2024-01-01 00:00:00", 'Equipo Ganador': ganador, 'Resultado': azar.choice(["Victoria", "Victoria", "Empate"]), 'Equipo Perdedor': perdedor, 'ResultadoManual': ""}
+        if azar.random() < 0.1: partido[azar.choice(['Equipo Ganador', 'Equipo Perdedor', 'Resultado'])] = azar.choice(["", None])
+        partidos.append(partido)
+    goles = [{'Fecha': "2024-01-01 00:00:00", 'Goleador': azar.choice(JUGADORES + [""]), 'Asistente': azar.choice(JUGADORES + ["", ""])} for _ in range(n)]
+    porterias = [{'Fecha': "2024-01-01 00:00:00", 'Portero': azar.choice(JUGADORES + [""])} for _ in range(n // 2)]
+    return partidos, goles, porterias
+
+@pytest.mark.parametrize("compactos", [False, True])
+@pytest.mark.parametrize("semilla", range(100))
+def test_igual_que_motor(semilla, compactos):
+    azar = random.Random(semilla)
+    partidos, goles, porterias = historial_aleatorio(azar, azar.randint(0, 40))
+    if compactos:
+        partidos, goles, porterias = (list(map(tipo.de_registro, h)) for tipo, h in ((Partido, partidos), (Gol, goles), (PorteriaCero, porterias)))
+
+    esperado = calcular_todas_las_estadisticas(partidos)
+    df = clasificacion_vectorizada(partidos)
+    assert list(df.index) == list(esperado)
+    for equipo, stats in esperado.items():
+        fila = df.loc[equipo]
+        for clave in ('V', 'E', 'D', 'T', 'P', 'Mejor Racha', 'Destronamientos', 'Intentos', 'Partidos con Trofeo'):
+            assert fila[clave] == stats[clave], (equipo, clave)
+        assert fila['PPM'] == pytest.approx(stats['PPM'])
+        assert fila['Indice Destronamiento'] == pytest.approx(stats['Indice Destronamiento'])
+        assert bool(fila['Portador']) == bool(stats.get('Portador'))
+
+    individuales = calcular_estadisticas_individuales(goles)
+    df = goleadores_vectorizado(goles)
+    assert {j: {c: int(v) for c, v in fila.items()} for j, fila in df.iterrows()} == individuales
+    assert list(df['G/A']) == sorted(df['G/A'], reverse=True)
+
+    porteros = calcular_estadisticas_porteros(porterias)
+    df = porteros_vectorizado(porterias)
+    assert {p: {'Porterías a 0': int(n)} for p, n in df['Porterías a 0'].items()} == porteros